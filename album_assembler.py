@@ -0,0 +1,87 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Tuple
+from telethon.tl.types import Message
+from loguru import logger
+from metrics import metrics
+
+AlbumKey = Tuple[int, int]
+FlushCallback = Callable[[List[Message]], Awaitable[None]]
+
+class AlbumAssembler:
+    """Collects album parts from live updates and flushes them as one group"""
+
+    def __init__(self, on_flush: FlushCallback, delay: float, max_size: int = 10):
+        self._on_flush = on_flush
+        self._delay = delay
+        self._max_size = max_size
+        self._albums: Dict[AlbumKey, List[Message]] = {}
+        self._timers: Dict[AlbumKey, asyncio.Task] = {}
+        self._started: Dict[AlbumKey, float] = {}
+
+    async def add(self, message: Message) -> None:
+        """Add album part to buffer and schedule flush"""
+        key = (message.chat_id, message.grouped_id)
+        album = self._albums.get(key)
+        if album is None:
+            album = self._albums[key] = []
+            self._started[key] = time.monotonic()
+        if any(msg.id == message.id for msg in album):
+            logger.debug("Message {} already buffered for album {}", message.id, message.grouped_id)
+            return
+
+        album.append(message)
+        logger.debug("Buffered message {} for album {} ({} parts)", message.id, message.grouped_id, len(album))
+
+        self._cancel_timer(key)
+        if len(album) >= self._max_size:
+            await self._flush(key)
+        else:
+            self._timers[key] = asyncio.create_task(self._flush_later(key))
+
+    async def _flush_later(self, key: AlbumKey) -> None:
+        """Flush album once no new parts arrived during the quiet window"""
+        try:
+            await asyncio.sleep(self._delay)
+        except asyncio.CancelledError:
+            return
+        self._timers.pop(key, None)
+        await self._flush(key)
+
+    async def _flush(self, key: AlbumKey) -> None:
+        """Hand buffered album over to flush callback"""
+        album = self._albums.pop(key, None)
+        started = self._started.pop(key, None)
+        if not album:
+            return
+        if started is not None:
+            metrics.album_assembly.observe(time.monotonic() - started)
+
+        album.sort(key=lambda msg: msg.id)
+        logger.debug("Flushing album {} with {} messages", key[1], len(album))
+        try:
+            await self._on_flush(album)
+        except Exception as e:
+            logger.error(f"Error flushing album {key[1]}: {str(e)}")
+
+    def _cancel_timer(self, key: AlbumKey) -> None:
+        """Cancel pending flush timer for album"""
+        timer = self._timers.pop(key, None)
+        if timer and not timer.done():
+            timer.cancel()
+
+    async def flush_all(self) -> None:
+        """Flush all buffered albums immediately"""
+        for key in list(self._albums):
+            self._cancel_timer(key)
+            await self._flush(key)
+
+    def clear(self) -> None:
+        """Drop buffered albums and cancel pending timers"""
+        for key in list(self._timers):
+            self._cancel_timer(key)
+        self._albums.clear()
+        self._started.clear()
+
+    def __len__(self) -> int:
+        return len(self._albums)
@@ -0,0 +1,294 @@
+"""Offline benchmark of the forwarding pipeline.
+
+Replaces TelegramClient with a local stand-in and feeds ChannelAggregator's
+handlers a synthetic trace of single posts and albums:
+
+    python benchmark.py --channels 200 --rate 300 --duration 20 --flood-rate 0.01
+
+Use --json for machine readable output and --min-throughput / --max-p99 /
+--max-calls-per-message to fail with exit code 1 on regressions.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Dict, List, Tuple
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the aggregator with a fake Telegram client")
+    parser.add_argument('--channels', type=int, default=100, help="number of monitored source channels")
+    parser.add_argument('--rate', type=float, default=200, help="incoming messages per second")
+    parser.add_argument('--duration', type=float, default=10, help="length of the trace in seconds")
+    parser.add_argument('--album-ratio', type=float, default=0.2, help="share of posts that are albums")
+    parser.add_argument('--latency', type=float, default=0.05, help="latency of every fake API call in seconds")
+    parser.add_argument('--flood-rate', type=float, default=0.0, help="probability of FloodWait per forward call")
+    parser.add_argument('--flood-seconds', type=int, default=1, help="length of injected FloodWait")
+    parser.add_argument('--forward-rate', type=float, default=30, help="RATE_LIMIT_FORWARD used for the run")
+    parser.add_argument('--drain-timeout', type=float, default=60, help="max seconds to wait for queued forwards")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    parser.add_argument('--min-throughput', type=float, help="fail if messages/sec is lower")
+    parser.add_argument('--max-p99', type=float, help="fail if p99 latency in seconds is higher")
+    parser.add_argument('--max-calls-per-message', type=float, help="fail if API calls per message is higher")
+    return parser.parse_args()
+
+ARGS = parse_args()
+
+# Configuration is read at import time, so it has to be in place before the bot modules are loaded
+os.environ.setdefault('API_ID', '0')
+os.environ.setdefault('API_HASH', 'benchmark')
+os.environ['RATE_LIMIT_FORWARD'] = str(ARGS.forward_rate)
+os.environ['RATE_LIMIT_DESTINATION'] = str(ARGS.forward_rate)
+os.environ.setdefault('MARK_READ_INTERVAL', '1')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = tempfile.mkdtemp(prefix='aggregator-bench-')
+os.chdir(WORK_DIR)
+
+from loguru import logger
+from telethon import events, utils
+from telethon.errors import FloodWaitError
+from telethon.tl.types import Message, MessageMediaPhoto, PeerChannel, Photo, PhotoSize
+import main
+
+TARGET_CHANNEL = 1
+
+class FakeTelegramClient:
+    """Local stand-in for TelegramClient with configurable latency and FloodWait errors"""
+
+    def __init__(self, *args, **kwargs):
+        self.latency = ARGS.latency
+        self.flood_rate = ARGS.flood_rate
+        self.flood_seconds = ARGS.flood_seconds
+        self.on_reconnect = None
+        self.handlers: List[Tuple[object, object]] = []
+        self.calls: Dict[str, int] = {}
+        self.delivered: Dict[Tuple[int, int], float] = {}
+        self.floods = 0
+        self._forwarded = 0
+        self.deleted: List[int] = []
+        self.messages: Dict[Tuple[int, int], Message] = {}
+
+    def _count(self, method: str) -> None:
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+    async def _rpc(self, method: str, flood: bool = False) -> None:
+        self._count(method)
+        await asyncio.sleep(self.latency)
+        if flood and random.random() < self.flood_rate:
+            self.floods += 1
+            raise FloodWaitError(request=None, capture=self.flood_seconds)
+
+    def on(self, builder):
+        def decorator(callback):
+            self.handlers.append((builder, callback))
+            return callback
+        return decorator
+
+    async def dispatch(self, message: Message) -> None:
+        """Deliver message to registered handlers that accept its chat"""
+        event = SimpleNamespace(message=message, chat_id=message.chat_id, raw_text=message.message)
+        for builder, callback in self.handlers:
+            if isinstance(builder, (events.MessageEdited, events.MessageDeleted)):
+                continue  # The trace only has new posts
+            if builder.chats is not None and message.chat_id not in builder.chats:
+                continue
+            if builder.func and not builder.func(event):
+                continue
+            await callback(event)
+
+    async def get_me(self):
+        await self._rpc('get_me')
+        return SimpleNamespace(id=42)
+
+    async def forward_messages(self, entity, messages, from_peer=None, **kwargs):
+        await self._rpc('forward_messages', flood=True)
+        now = time.monotonic()
+        ids = messages if isinstance(messages, list) else [messages]
+        for message_id in ids:
+            self.delivered.setdefault((from_peer, message_id), now)
+        self._forwarded += len(ids)
+        return [SimpleNamespace(id=self._forwarded - len(ids) + n + 1) for n in range(len(ids))]
+
+    async def delete_messages(self, entity, message_ids, **kwargs):
+        await self._rpc('delete_messages')
+        self.deleted.extend(message_ids)
+
+    async def send_read_acknowledge(self, entity, max_id=None, **kwargs):
+        await self._rpc('send_read_acknowledge')
+        return True
+
+    async def send_message(self, entity, message, **kwargs):
+        await self._rpc('send_message', flood=True)
+
+    async def get_messages(self, entity, min_id=0, limit=None, reverse=False, ids=None, **kwargs):
+        await self._rpc('get_messages')
+        chat_id = utils.get_peer_id(entity)
+        found = [m for (c, _), m in self.messages.items() if c == chat_id and m.id > min_id]
+        return sorted(found, key=lambda m: m.id, reverse=not reverse)[:limit]
+
+    async def iter_messages(self, entity, **kwargs):
+        for message in await self.get_messages(entity, **kwargs):
+            yield message
+
+    async def get_entity(self, entity):
+        await self._rpc('get_entity')
+        peers = entity if isinstance(entity, list) else [entity]
+        channels = [
+            SimpleNamespace(id=utils.resolve_id(utils.get_peer_id(peer))[0], title='Channel', username=None, left=False)
+            for peer in peers
+        ]
+        return channels if isinstance(entity, list) else channels[0]
+
+    async def __call__(self, request):
+        await self._rpc(type(request).__name__)
+
+    def is_connected(self) -> bool:
+        return True
+
+    async def disconnect(self) -> None:
+        pass
+
+def make_trace() -> List[Tuple[float, Message]]:
+    """Build (send time, message) pairs of single posts and albums across channels"""
+    random.seed(ARGS.seed)
+    trace = []
+    next_ids = {channel: 1 for channel in range(2, ARGS.channels + 2)}
+    date = datetime.now(timezone.utc)
+    total = int(ARGS.rate * ARGS.duration)
+    at = 0.0
+    while len(trace) < total:
+        at += random.expovariate(ARGS.rate)
+        channel = random.choice(list(next_ids))
+        parts = random.randint(2, 10) if random.random() < ARGS.album_ratio else 1
+        grouped_id = random.getrandbits(62) if parts > 1 else None
+        for part in range(parts):
+            message_id = next_ids[channel]
+            next_ids[channel] += 1
+            media = None
+            if parts > 1 or random.random() < 0.3:
+                photo_id = random.getrandbits(62)
+                media = MessageMediaPhoto(photo=Photo(
+                    id=photo_id, access_hash=photo_id, file_reference=b'', date=date,
+                    sizes=[PhotoSize(type='x', w=1, h=1, size=1)], dc_id=1
+                ))
+            text = f"Post {message_id} from channel {channel} {random.getrandbits(64)}" if part == 0 else ''
+            trace.append((at + part * 0.01, Message(
+                id=message_id, peer_id=PeerChannel(channel), date=date,
+                message=text, media=media, grouped_id=grouped_id
+            )))
+    trace.sort(key=lambda item: item[0])
+    return trace
+
+def percentile(values: List[float], share: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+async def run() -> Dict[str, float]:
+    main.AggregatorClient = FakeTelegramClient
+    aggregator = main.ChannelAggregator()
+    client: FakeTelegramClient = aggregator.client
+
+    with aggregator.storage.batch():
+        for channel in range(2, ARGS.channels + 2):
+            aggregator.storage.add_channel(channel, {'title': f'Channel {channel}'})
+    aggregator.storage.set_target(TARGET_CHANNEL)
+    await aggregator.command_handler.setup()
+    await aggregator._register_message_handlers()
+    await aggregator._start_sessions()
+    aggregator.message_handler.start()
+    await aggregator._handle_early_updates()
+    aggregator.command_handler.is_running = True
+
+    trace = make_trace()
+    sent_at: Dict[Tuple[int, int], float] = {}
+    started = time.monotonic()
+    for at, message in trace:
+        delay = started + at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        client.messages[(message.chat_id, message.id)] = message
+        sent_at[(message.chat_id, message.id)] = time.monotonic()
+        await client.dispatch(message)
+
+    # Wait until every message was forwarded or drain timeout passes
+    deadline = time.monotonic() + ARGS.drain_timeout
+    while len(client.delivered) < len(sent_at) and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+    finished = max(client.delivered.values(), default=time.monotonic())
+    calls = sum(client.calls.values()) - client.calls.get('get_me', 0)
+
+    # Deleting every 10th forwarded post in its source has to delete its forward, in batched calls
+    deleted: Dict[int, List[int]] = {}
+    for chat_id, message_id in list(client.delivered)[::10]:
+        deleted.setdefault(chat_id, []).append(message_id)
+    for chat_id, message_ids in deleted.items():
+        aggregator.message_handler.process_deletion(utils.resolve_id(chat_id)[0], message_ids)
+    await aggregator.message_handler.stop()
+
+    latencies = [client.delivered[key] - sent for key, sent in sent_at.items() if key in client.delivered]
+    forwarded = len(latencies)
+    return {
+        'messages': len(sent_at),
+        'forwarded': forwarded,
+        'lost': len(sent_at) - forwarded,
+        'messages_per_sec': forwarded / max(finished - started, 1e-9),
+        'latency_p50': percentile(latencies, 0.50),
+        'latency_p99': percentile(latencies, 0.99),
+        'api_calls': calls,
+        'api_calls_per_message': calls / max(forwarded, 1),
+        'forward_calls': client.calls.get('forward_messages', 0),
+        'flood_waits': client.floods,
+        'deletes': sum(map(len, deleted.values())),
+        'mirrored_deletes': len(client.deleted),
+        'delete_calls': client.calls.get('delete_messages', 0),
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+def report(results: Dict[str, float]) -> int:
+    if ARGS.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"Messages:            {results['messages']} ({results['forwarded']} forwarded, {results['lost']} lost)")
+        print(f"Throughput:          {results['messages_per_sec']:.1f} messages/sec")
+        print(f"Latency p50 / p99:   {results['latency_p50']:.3f}s / {results['latency_p99']:.3f}s")
+        print(f"API calls:           {results['api_calls']} ({results['api_calls_per_message']:.3f} per message, "
+              f"{results['forward_calls']} forwards, {results['flood_waits']} FloodWaits)")
+        print(f"Mirrored deletes:    {results['mirrored_deletes']} of {results['deletes']} "
+              f"({results['delete_calls']} delete calls)")
+        print(f"Peak RSS:            {results['peak_rss_mb']:.1f} MB")
+
+    failures = []
+    if ARGS.min_throughput is not None and results['messages_per_sec'] < ARGS.min_throughput:
+        failures.append(f"throughput {results['messages_per_sec']:.1f} < {ARGS.min_throughput}")
+    if ARGS.max_p99 is not None and results['latency_p99'] > ARGS.max_p99:
+        failures.append(f"p99 latency {results['latency_p99']:.3f}s > {ARGS.max_p99}s")
+    if ARGS.max_calls_per_message is not None and results['api_calls_per_message'] > ARGS.max_calls_per_message:
+        failures.append(f"API calls per message {results['api_calls_per_message']:.3f} > {ARGS.max_calls_per_message}")
+    if results['mirrored_deletes'] < results['deletes']:
+        failures.append(f"{results['deletes'] - results['mirrored_deletes']} deletions not mirrored")
+    if results['lost']:
+        failures.append(f"{results['lost']} messages not forwarded")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+    try:
+        code = report(asyncio.run(run()))
+    finally:
+        os.chdir('/')
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+    sys.exit(code)
@@ -1,23 +1,82 @@
-from typing import Optional, Tuple
+import asyncio
+import json
+import os
+import re
+import shlex
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from telethon import TelegramClient, events
-from telethon.tl.types import User, Channel, PeerChannel
+from telethon.tl.types import Channel, PeerChannel, PeerUser
 from telethon.tl.functions.channels import JoinChannelRequest
 from loguru import logger
 from config import *
 from storage import Storage
-import re
+from rate_limiter import RateLimiter
+from entity_cache import EntityCache
+from routing import MEDIA_TYPES, Router
+from metrics import metrics
+from session_pool import SessionPool
+from dialog_sync import ARCHIVE_FOLDER, MAIN_FOLDER, scan_channels
 
 class CommandHandler:
-    def __init__(self, client: TelegramClient, storage: Storage):
+    def __init__(
+        self,
+        client: TelegramClient,
+        storage: Storage,
+        rate_limiter: RateLimiter,
+        entity_cache: EntityCache,
+        router: Router,
+        on_start: Optional[Callable[[], Awaitable[None]]] = None,
+        pool: Optional[SessionPool] = None
+    ):
         self.client = client
         self.storage = storage
-        self.is_running = False
-        self.me: Optional[User] = None
+        self.rate_limiter = rate_limiter
+        self.entity_cache = entity_cache
+        self.router = router
+        self.on_start = on_start
+        self.pool = pool
+        # Running state survives restarts, so updates and forwards resume without /start
+        self.is_running = storage.get_running()
+        # Stopped with /stop, unlike never started, posts meanwhile are not caught up
+        self.paused = storage.get_paused()
+        self.me_id: Optional[int] = None
 
     async def setup(self) -> None:
         """Setup command handler"""
-        self.me = await self.client.get_me()
         await self._register_handlers()
+        self.me_id = self._load_me()
+        if self.me_id is None:
+            await self._refresh_me()
+        else:
+            # Cached id lets commands through right away, check it in background
+            asyncio.create_task(self._refresh_me())
+
+    async def _reply(self, event, message: str):
+        """Reply to command through the rate limiter"""
+        return await self.rate_limiter.call('send_message', event.chat_id, message, reply_to=event.id)
+
+    def _load_me(self) -> Optional[int]:
+        """Get cached id of logged in account"""
+        try:
+            with open(ME_CACHE_FILE, 'r') as f:
+                return json.load(f)['id']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    async def _refresh_me(self) -> None:
+        """Fetch id of logged in account and cache it"""
+        try:
+            me = await self.rate_limiter.call('get_me')
+        except Exception as e:
+            logger.error(f"Error getting current user: {str(e)}")
+            return
+        if me.id != self.me_id:
+            self.me_id = me.id
+            tmp_path = ME_CACHE_FILE + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'id': me.id}, f)
+            os.replace(tmp_path, ME_CACHE_FILE)
 
     def _parse_channel_input(self, input_str: str) -> str:
         """Parse channel input to get username"""
@@ -35,146 +94,403 @@ def _parse_channel_input(self, input_str: str) -> str:
             
         return input_str.strip()
 
-    async def _get_channel(self, channel_input: str) -> Tuple[Optional[Channel], str]:
-        """Get channel entity and formatted name"""
+    async def _get_channel(self, channel_input: str, join: bool = False) -> Tuple[Optional[int], str]:
+        """Get channel id and formatted name"""
         try:
             username = self._parse_channel_input(channel_input)
-            
-            # Try to get channel
-            channel = await self.client.get_entity(username)
-            
-            if not isinstance(channel, (Channel, PeerChannel)):
-                return None, MSG_INVALID_CHANNEL
-                
+
+            # Try cached username first, resolve only on miss
+            channel_id = self.entity_cache.get_by_username(username)
+            if channel_id is None:
+                channel = await self.rate_limiter.call('get_entity', username)
+
+                if not isinstance(channel, Channel):
+                    return None, MSG_INVALID_CHANNEL
+
+                self.entity_cache.put(channel)
+                channel_id = channel.id
+            entry = self.entity_cache.get(channel_id)
+
             # Try to join the channel if not already joined
-            try:
-                await self.client(JoinChannelRequest(channel))
-            except Exception as e:
-                logger.warning(f"Could not join channel {username}: {str(e)}")
-            
-            return channel, channel.username or channel.title
-            
+            if join and not entry.get('joined'):
+                try:
+                    await self.rate_limiter.invoke(JoinChannelRequest(PeerChannel(channel_id)))
+                    self.entity_cache.set_joined(channel_id)
+                except Exception as e:
+                    logger.warning(f"Could not join channel {username}: {str(e)}")
+
+            self.entity_cache.save()
+            return channel_id, self.entity_cache.display_name(entry)
+
         except ValueError:
             return None, MSG_INVALID_CHANNEL
         except Exception as e:
             logger.error(f"Error getting channel {channel_input}: {str(e)}")
             return None, MSG_CHANNEL_NOT_FOUND
 
+    def _channel_meta(self, channel: Channel) -> dict:
+        """Get metadata stored along with monitored channel"""
+        return {'title': channel.title, 'username': channel.username}
+
+    def _cached_meta(self, channel_id: int) -> dict:
+        """Get metadata of channel from entity cache"""
+        entry = self.entity_cache.get(channel_id) or {}
+        return {'title': entry.get('title'), 'username': entry.get('username')}
+
     async def _register_handlers(self) -> None:
-        """Register message handlers for commands"""
-        @self.client.on(events.NewMessage(pattern=CMD_START))
-        async def start_handler(event):
-            if not await self._is_saved_messages(event):
-                return
-            self.is_running = True
-            await event.reply(MSG_BOT_STARTED)
+        """Register single dispatcher for all commands"""
+        self._commands: Dict[str, Callable[[Any, str], Awaitable[None]]] = {
+            CMD_START: self._start_handler,
+            CMD_STOP: self._stop_handler,
+            CMD_ADD_ALL_CHANNELS: self._add_all_channels_handler,
+            CMD_ADD_CHANNEL: self._add_channel_handler,
+            CMD_REMOVE_CHANNEL: self._remove_channel_handler,
+            CMD_SET_TARGET: self._set_target_handler,
+            CMD_LIST: self._list_handler,
+            CMD_STATUS: self._status_handler,
+            CMD_ADD_ROUTE: self._add_route_handler,
+            CMD_REMOVE_ROUTE: self._remove_route_handler,
+            CMD_ROUTES: self._routes_handler,
+            CMD_DIGEST: self._digest_handler,
+            CMD_STATS: self._stats_handler,
+            CMD_PRIORITY: self._priority_handler,
+        }
 
-        @self.client.on(events.NewMessage(pattern=CMD_STOP))
-        async def stop_handler(event):
-            if not await self._is_saved_messages(event):
+        @self.client.on(events.NewMessage(func=self._is_saved_messages))
+        async def dispatch(event):
+            text = event.raw_text
+            if not text.startswith('/'):
                 return
-            self.is_running = False
-            await event.reply(MSG_BOT_STOPPED)
-
-        @self.client.on(events.NewMessage(pattern=CMD_ADD_ALL_CHANNELS))
-        async def add_all_channels_handler(event):
-            if not await self._is_saved_messages(event):
+            parts = text.split(None, 1)
+            handler = self._commands.get(parts[0])
+            if not handler:
                 return
-            
-            await event.reply(MSG_ADDING_ALL_CHANNELS)
-            added_count = 0
-
+            args = parts[1].strip() if len(parts) > 1 else ''
+            metrics.commands.inc(parts[0])
+            started = time.monotonic()
             try:
-                # Get all dialogs (channels, chats, etc.)
-                async for dialog in self.client.iter_dialogs():
-                    # Check if it's a channel (not a group or private chat)
-                    if isinstance(dialog.entity, Channel) and not dialog.entity.broadcast:
-                        continue  # Skip if it's a group chat
-                    
-                    if isinstance(dialog.entity, Channel) and dialog.entity.broadcast:
-                        # Skip if it's the target channel
-                        if dialog.entity.id == self.storage.get_target():
-                            continue
-                            
-                        # Add channel to monitoring list
-                        if self.storage.add_channel(dialog.entity.id):
-                            added_count += 1
-                            
-                await event.reply(MSG_ALL_CHANNELS_ADDED.format(added_count))
+                await handler(event, args)
             except Exception as e:
-                logger.error(f"Error adding all channels: {str(e)}")
-                await event.reply(f"Error occurred while adding channels: {str(e)}")
+                logger.error(f"Error handling command {parts[0]}: {str(e)}")
+            finally:
+                metrics.command_latency.observe(time.monotonic() - started, parts[0])
 
-        @self.client.on(events.NewMessage(pattern=CMD_ADD_CHANNEL + r'\s+(.+)'))
-        async def add_channel_handler(event):
-            if not await self._is_saved_messages(event):
-                return
-            channel_input = event.pattern_match.group(1)
-            channel, name = await self._get_channel(channel_input)
-            
-            if channel:
-                self.storage.add_channel(channel.id)
-                await event.reply(MSG_CHANNEL_ADDED.format(name))
-            else:
-                await event.reply(name)  # Error message
+    async def _start_handler(self, event, args: str) -> None:
+        self.is_running = True
+        self.paused = False
+        self.storage.set_running(True)
+        await self._reply(event, MSG_BOT_STARTED)
+        if self.on_start:
+            asyncio.create_task(self.on_start())
 
-        @self.client.on(events.NewMessage(pattern=CMD_REMOVE_CHANNEL + r'\s+(.+)'))
-        async def remove_channel_handler(event):
-            if not await self._is_saved_messages(event):
-                return
-            channel_input = event.pattern_match.group(1)
-            channel, name = await self._get_channel(channel_input)
-            
-            if channel:
-                self.storage.remove_channel(channel.id)
-                await event.reply(MSG_CHANNEL_REMOVED.format(name))
-            else:
-                await event.reply(name)  # Error message
+    async def _stop_handler(self, event, args: str) -> None:
+        self.is_running = False
+        self.paused = True
+        self.storage.set_running(False)
+        await self._reply(event, MSG_BOT_STOPPED)
 
-        @self.client.on(events.NewMessage(pattern=CMD_SET_TARGET + r'\s+(.+)'))
-        async def set_target_handler(event):
-            if not await self._is_saved_messages(event):
-                return
-            channel_input = event.pattern_match.group(1)
-            channel, name = await self._get_channel(channel_input)
-            
-            if channel:
-                self.storage.set_target(channel.id)
-                await event.reply(MSG_TARGET_SET.format(name))
-            else:
-                await event.reply(name)  # Error message
+    async def _add_all_channels_handler(self, event, args: str) -> None:
+        # "new" only looks at dialogs with posts since the last sync
+        incremental = args.lower() == 'new'
+        since = self.storage.get_dialogs_synced() if incremental else 0
+        progress = await self._reply(event, MSG_ADDING_ALL_CHANNELS)
+        stored = set(self.storage.get_channels())
+        target = self.storage.get_target()
+        found: Dict[int, Channel] = {}
+        scanned_count = new_count = 0
+        reported = time.monotonic()
 
-        @self.client.on(events.NewMessage(pattern=CMD_LIST))
-        async def list_handler(event):
-            if not await self._is_saved_messages(event):
-                return
-            channels = []
-            for channel_id in self.storage.get_channels():
+        async def on_page(scanned: int, channels: List[Channel]) -> None:
+            nonlocal scanned_count, new_count, reported
+            scanned_count += scanned
+            for channel in channels:
+                if channel.id not in found and channel.id not in stored and channel.id != target:
+                    new_count += 1
+                found[channel.id] = channel
+            if time.monotonic() - reported >= SYNC_PROGRESS_INTERVAL:
+                reported = time.monotonic()
                 try:
-                    channel = await self.client.get_entity(channel_id)
-                    channels.append(f"- {channel.username or channel.title}")
+                    await self.rate_limiter.call(
+                        'edit_message', progress, MSG_SYNC_PROGRESS.format(scanned_count, new_count)
+                    )
                 except Exception as e:
-                    logger.error(f"Error getting channel info: {str(e)}")
-            
-            target = self.storage.get_target()
-            target_info = ""
-            if target:
+                    logger.debug("Could not update sync progress: {}", str(e))
+
+        try:
+            # Main list and archive are paged independently
+            results = await asyncio.gather(
+                scan_channels(self.rate_limiter, MAIN_FOLDER, on_page, since),
+                scan_channels(self.rate_limiter, ARCHIVE_FOLDER, on_page, since)
+            )
+
+            # Diff against monitored channels, channels file is written once
+            added_count = 0
+            with self.storage.batch():
+                for channel_id, channel in found.items():
+                    self.entity_cache.put(channel)
+                    if channel_id != target and channel_id not in stored:
+                        self.storage.add_channel(channel_id, self._channel_meta(channel))
+                        added_count += 1
+                self.storage.set_dialogs_synced(max(newest for _, newest in results))
+            self.entity_cache.save()
+            logger.info(f"Scanned {scanned_count} dialogs, added {added_count} channels")
+
+            message = MSG_ALL_CHANNELS_ADDED.format(added_count)
+            missing = len(stored - set(found))
+            if not incremental and missing:
+                message += "\n" + MSG_SYNC_MISSING.format(missing)
+            await self._reply(event, message)
+        except Exception as e:
+            logger.error(f"Error adding all channels: {str(e)}")
+            await self._reply(event, f"Error occurred while adding channels: {str(e)}")
+
+    async def _add_channel_handler(self, event, args: str) -> None:
+        if not args:
+            await self._reply(event, MSG_INVALID_CHANNEL)
+            return
+        channel_id, name = await self._get_channel(args, join=True)
+
+        if channel_id:
+            self.storage.add_channel(channel_id, self._cached_meta(channel_id))
+            await self._reply(event, MSG_CHANNEL_ADDED.format(name))
+        else:
+            await self._reply(event, name)  # Error message
+
+    async def _remove_channel_handler(self, event, args: str) -> None:
+        if not args:
+            await self._reply(event, MSG_INVALID_CHANNEL)
+            return
+        channel_id, name = await self._get_channel(args)
+
+        if channel_id:
+            self.storage.remove_channel(channel_id)
+            await self._reply(event, MSG_CHANNEL_REMOVED.format(name))
+        else:
+            await self._reply(event, name)  # Error message
+
+    async def _set_target_handler(self, event, args: str) -> None:
+        if not args:
+            await self._reply(event, MSG_INVALID_CHANNEL)
+            return
+        channel_id, name = await self._get_channel(args)
+
+        if channel_id:
+            self.storage.set_target(channel_id)
+            await self._reply(event, MSG_TARGET_SET.format(name))
+        else:
+            await self._reply(event, name)  # Error message
+
+    async def _list_handler(self, event, args: str) -> None:
+        all_channels = self.storage.get_channels()
+        pages = max(1, -(-len(all_channels) // LIST_PAGE_SIZE))
+        page = int(args) if args.isdigit() else 1
+        page = min(max(page, 1), pages)
+        page_channels = all_channels[(page - 1) * LIST_PAGE_SIZE:page * LIST_PAGE_SIZE]
+
+        # Only channels of requested page are resolved, cache misses in parallel
+        target = self.storage.get_target()
+        names = await self.entity_cache.resolve_names(
+            page_channels + [target] if target else page_channels
+        )
+        channels = [f"- {names[channel_id]}" for channel_id in page_channels if channel_id in names]
+
+        target_info = ""
+        if target in names:
+            target_info = f"\nTarget channel: {names[target]}"
+
+        header = "Monitored channels:"
+        if pages > 1:
+            header = f"Monitored channels (page {page}/{pages}, use {CMD_LIST} <page>):"
+        # Long channel titles can make a page longer than Telegram allows in one message
+        messages = [header]
+        for line in channels + ([target_info.strip()] if target_info else []):
+            if len(messages[-1]) + 1 + len(line) > MAX_MESSAGE_LENGTH:
+                messages.append(line[:MAX_MESSAGE_LENGTH])
+            else:
+                messages[-1] += "\n" + line
+        for message in messages:
+            await self._reply(event, message)
+
+    async def _status_handler(self, event, args: str) -> None:
+        status = "running" if self.is_running else "stopped"
+        message = f"Bot status: {status}"
+        waits = self.rate_limiter.get_wait_times()
+        if waits:
+            message += "\nRate limited:\n" + "\n".join(
+                f"- {name}: {seconds}s" for name, seconds in waits.items()
+            )
+        if self.pool and len(self.pool.sessions()) > 1:
+            message += "\nSessions:\n" + "\n".join(
+                f"- {session.name}: {session.channel_count()} channels"
+                + (" (FloodWait)" if session.is_blocked() else "")
+                for session in self.pool.sessions()
+            )
+        await self._reply(event, message)
+
+    async def _add_route_handler(self, event, args: str) -> None:
+        usage = MSG_ROUTE_USAGE.format(", ".join(MEDIA_TYPES))
+        try:
+            tokens = shlex.split(args)
+        except ValueError:
+            tokens = []
+        if len(tokens) < 2:
+            await self._reply(event, usage)
+            return
+
+        rule = {'source': None}
+        for token in tokens[2:]:
+            key, _, value = token.partition('=')
+            if key in ('include', 'exclude', 'media') and value:
+                rule[key] = [item.strip() for item in value.split(',') if item.strip()]
+            elif key == 'regex' and value:
                 try:
-                    target_channel = await self.client.get_entity(target)
-                    target_info = f"\nTarget channel: {target_channel.username or target_channel.title}"
-                except Exception as e:
-                    logger.error(f"Error getting target channel info: {str(e)}")
-            
-            message = "Monitored channels:\n" + "\n".join(channels) + target_info
-            await event.reply(message)
+                    re.compile(value)
+                except re.error as e:
+                    await self._reply(event, f"Invalid regex: {str(e)}")
+                    return
+                rule['regex'] = value
+            else:
+                await self._reply(event, usage)
+                return
+        if set(rule.get('media', [])) - set(MEDIA_TYPES):
+            await self._reply(event, usage)
+            return
 
-        @self.client.on(events.NewMessage(pattern=CMD_STATUS))
-        async def status_handler(event):
-            if not await self._is_saved_messages(event):
+        if tokens[0] != '*':
+            source_id, name = await self._get_channel(tokens[0], join=True)
+            if not source_id:
+                await self._reply(event, name)  # Error message
                 return
-            status = "running" if self.is_running else "stopped"
-            await event.reply(f"Bot status: {status}")
+            # Routed sources have to be monitored to receive their posts
+            self.storage.add_channel(source_id, self._cached_meta(source_id))
+            rule['source'] = source_id
+
+        target_id, name = await self._get_channel(tokens[1])
+        if not target_id:
+            await self._reply(event, name)  # Error message
+            return
+        rule['target'] = target_id
+
+        route_id = self.storage.add_route(rule)
+        self.router.compile()
+        await self._reply(event, MSG_ROUTE_ADDED.format(route_id))
+
+    async def _remove_route_handler(self, event, args: str) -> None:
+        if not args.isdigit():
+            await self._reply(event, f"Usage: {CMD_REMOVE_ROUTE} <route id>")
+            return
+        if self.storage.remove_route(int(args)):
+            self.router.compile()
+            await self._reply(event, MSG_ROUTE_REMOVED.format(args))
+        else:
+            await self._reply(event, MSG_ROUTE_NOT_FOUND.format(args))
+
+    async def _routes_handler(self, event, args: str) -> None:
+        routes = self.storage.get_routes()
+        if not routes:
+            await self._reply(event, MSG_NO_ROUTES)
+            return
+
+        channel_ids = {route['target'] for route in routes}
+        channel_ids |= {route['source'] for route in routes if route.get('source')}
+        names = await self.entity_cache.resolve_names(channel_ids)
+
+        lines = ["Routes:"]
+        for route in routes:
+            source = names.get(route['source'], route['source']) if route.get('source') else '*'
+            line = f"{route['id']}. {source} -> {names.get(route['target'], route['target'])}"
+            for key in ('include', 'exclude', 'media'):
+                if route.get(key):
+                    line += f" {key}={','.join(route[key])}"
+            if route.get('regex'):
+                line += f" regex={route['regex']}"
+            lines.append(line)
+        await self._reply(event, "\n".join(lines))
+
+    async def _digest_handler(self, event, args: str) -> None:
+        if args.lower() in ('on', 'off'):
+            self.storage.set_digest_mode(args.lower() == 'on')
+        state = "on" if self.storage.get_digest_mode() else "off"
+        await self._reply(event, MSG_DIGEST_MODE.format(state))
+
+    async def _priority_handler(self, event, args: str) -> None:
+        usage = MSG_PRIORITY_USAGE.format(MAX_PRIORITY)
+        if not args:
+            priorities = self.storage.get_priorities()
+            if not priorities:
+                await self._reply(event, usage)
+                return
+            names = await self.entity_cache.resolve_names(priorities)
+            lines = ["Channel priorities:"] + [
+                f"- {names.get(channel_id, channel_id)}: {priority}"
+                for channel_id, priority in sorted(priorities.items(), key=lambda item: -item[1])
+            ]
+            await self._reply(event, "\n".join(lines))
+            return
+
+        parts = args.rsplit(None, 1)
+        if len(parts) != 2 or not parts[1].isdigit() or not 1 <= int(parts[1]) <= MAX_PRIORITY:
+            await self._reply(event, usage)
+            return
+        channel_id, name = await self._get_channel(parts[0])
+        if not channel_id:
+            await self._reply(event, name)  # Error message
+            return
+        if not self.storage.is_monitored(channel_id):
+            await self._reply(event, f"Channel {name} is not monitored.")
+            return
+        self.storage.set_priority(channel_id, int(parts[1]))
+        await self._reply(event, MSG_PRIORITY_SET.format(name, parts[1]))
+
+    async def _stats_handler(self, event, args: str) -> None:
+        uptime = int(time.time() - metrics.started)
+        lines = [
+            f"Uptime: {uptime // 3600}h {uptime % 3600 // 60}m",
+            f"Updates received: {metrics.updates_received.total():g}",
+            f"Messages forwarded: {metrics.forwarded_messages.get('ok'):g} "
+            f"(failed: {metrics.forwarded_messages.get('failed'):g}, requests: {metrics.forwards.get('ok'):g})",
+            f"Forward queue: {metrics.queue_depth.get():g} batches, {metrics.pending_messages.get():g} messages pending",
+        ]
+        caches = []
+        for cache in ('messages', 'albums', 'content'):
+            lookups = metrics.dedup_cache.get(cache, 'hits') + metrics.dedup_cache.get(cache, 'misses')
+            caches.append(
+                f"{cache} {metrics.dedup_cache.get(cache, 'size'):g} entries, "
+                f"{metrics.dedup_cache.get(cache, 'hits'):g}/{lookups:g} hits"
+            )
+        lines.append("Dedup caches: " + "; ".join(caches))
+        filtered = metrics.updates_filtered.items()
+        if filtered:
+            lines.append("Filtered: " + ", ".join(f"{reason}={value:g}" for (reason,), value in filtered))
+        if metrics.album_assembly.count():
+            lines.append(f"Album assembly: {metrics.album_assembly.average():.2f}s avg")
+        copied = metrics.copied_messages.total()
+        if copied:
+            transfer_time = metrics.copy_transfer.average() * metrics.copy_transfer.count()
+            megabytes = metrics.copied_bytes.total() / 1024 / 1024
+            lines.append(
+                f"Copied: {copied:g} messages, {megabytes:.1f} MB at "
+                f"{megabytes / transfer_time if transfer_time else 0:.1f} MB/s, "
+                f"upload cache hits: {metrics.upload_cache.get('hit'):g}/{metrics.upload_cache.total():g}"
+            )
+        mirrored = metrics.mirrored_changes.items()
+        if mirrored:
+            lines.append("Mirrored: " + ", ".join(f"{change}={value:g}" for (change,), value in mirrored))
+        flood = metrics.flood_wait.items()
+        if flood:
+            lines.append("FloodWait: " + ", ".join(f"{method}={value:g}s" for (method,), value in flood))
+        api_methods = metrics.api_latency.label_values()
+        if api_methods:
+            lines.append("API calls:")
+            lines.extend(
+                f"- {method}: {metrics.api_latency.count(method)} calls, "
+                f"{metrics.api_latency.average(method) * 1000:.0f}ms avg, "
+                f"{metrics.api_errors.get(method):g} errors"
+                for (method,) in api_methods
+            )
+        await self._reply(event, "\n".join(lines))
 
-    async def _is_saved_messages(self, event) -> bool:
+    def _is_saved_messages(self, event) -> bool:
         """Check if message is from Saved Messages"""
-        return event.message.peer_id.user_id == self.me.id 
\ No newline at end of file
+        peer = event.message.peer_id
+        return isinstance(peer, PeerUser) and peer.user_id == self.me_id
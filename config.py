@@ -9,10 +9,8 @@
 API_HASH = os.getenv('API_HASH')
 PHONE_NUMBER = os.getenv('PHONE_NUMBER')
 
-# Create sessions directory if not exists
+# Sessions directory, created on start
 SESSIONS_DIR = 'sessions'
-if not os.path.exists(SESSIONS_DIR):
-    os.makedirs(SESSIONS_DIR)
 
 # Session configuration
 SESSION_NAME = os.path.join(SESSIONS_DIR, 'aggregator_bot')
@@ -20,9 +18,129 @@
 SYSTEM_VERSION = 'Bot 1.0'
 APP_VERSION = '1.0'
 
+# Id of the logged in account, so commands work before get_me() returns
+ME_CACHE_FILE = os.path.join(SESSIONS_DIR, 'me.json')
+
+# Run on uvloop if it is installed
+USE_UVLOOP = os.getenv('USE_UVLOOP', 'false').lower() in ('1', 'true', 'yes')
+# Channel updates kept while the bot is starting, handled once startup is done
+EARLY_UPDATES_MAX = 10000
+
 # Database file name
 DB_FILE = 'channels.json'
 
+# Last forwarded ids are saved to DB_FILE at most once per this many seconds
+LAST_IDS_SAVE_INTERVAL = float(os.getenv('LAST_IDS_SAVE_INTERVAL', '10'))
+
+# Catch-up of messages missed while offline: parallel channel fetches and max messages per channel
+BACKFILL_CONCURRENCY = int(os.getenv('BACKFILL_CONCURRENCY', '10'))
+BACKFILL_LIMIT = int(os.getenv('BACKFILL_LIMIT', '200'))
+
+# Cache of channel names and usernames, refreshed after TTL seconds
+ENTITY_CACHE_FILE = os.path.join(SESSIONS_DIR, 'entities.json')
+ENTITY_CACHE_TTL = float(os.getenv('ENTITY_CACHE_TTL', '86400'))
+ENTITY_RESOLVE_CONCURRENCY = int(os.getenv('ENTITY_RESOLVE_CONCURRENCY', '8'))
+# Channels per /list page, a page is sent as several messages when it is longer than a message can be
+LIST_PAGE_SIZE = 100
+MAX_MESSAGE_LENGTH = 4096
+# Seconds between progress updates of /add_all_channels
+SYNC_PROGRESS_INTERVAL = 3
+
+# Album assembly: quiet window in seconds before a buffered album is forwarded
+ALBUM_FLUSH_DELAY = float(os.getenv('ALBUM_FLUSH_DELAY', '0.5'))
+ALBUM_MAX_SIZE = 10
+
+# Dedup cache of processed messages: max entries and time to live in seconds
+DEDUP_CACHE_SIZE = int(os.getenv('DEDUP_CACHE_SIZE', '10000'))
+DEDUP_CACHE_TTL = float(os.getenv('DEDUP_CACHE_TTL', '86400'))
+
+# Forwarding pipeline: worker count, per-channel coalescing window in seconds, max ids per request
+FORWARD_WORKERS = int(os.getenv('FORWARD_WORKERS', '4'))
+FORWARD_BATCH_WINDOW = float(os.getenv('FORWARD_BATCH_WINDOW', '0.3'))
+FORWARD_BATCH_SIZE = 100
+# Per-channel queue: max waiting messages and what to drop when full (drop_oldest or drop_newest)
+FORWARD_QUEUE_DEPTH = int(os.getenv('FORWARD_QUEUE_DEPTH', '1000'))
+FORWARD_QUEUE_OVERFLOW = os.getenv('FORWARD_QUEUE_OVERFLOW', 'drop_oldest')
+# Failed forwards are retried with doubling delay, then dropped after max attempts or max age in seconds
+FORWARD_MAX_ATTEMPTS = int(os.getenv('FORWARD_MAX_ATTEMPTS', '5'))
+FORWARD_RETRY_DELAY = float(os.getenv('FORWARD_RETRY_DELAY', '5'))
+FORWARD_MAX_AGE = float(os.getenv('FORWARD_MAX_AGE', '86400'))
+# Channel priorities set with /priority, a channel of priority 3 gets 3 times the forwards of priority 1
+MAX_PRIORITY = 10
+
+# Durable outbox of queued forwards and its group commit interval in seconds
+OUTBOX_FILE = 'outbox.db'
+OUTBOX_COMMIT_INTERVAL = float(os.getenv('OUTBOX_COMMIT_INTERVAL', '0.1'))
+
+# Cross-channel dedup of reposted content: window in seconds, max fingerprints, min normalized text length
+CONTENT_DEDUP = os.getenv('CONTENT_DEDUP', 'true').lower() in ('1', 'true', 'yes')
+CONTENT_DEDUP_FILE = 'fingerprints.bin'
+CONTENT_DEDUP_WINDOW = float(os.getenv('CONTENT_DEDUP_WINDOW', '86400'))
+CONTENT_DEDUP_MAX_ENTRIES = int(os.getenv('CONTENT_DEDUP_MAX_ENTRIES', '1000000'))
+CONTENT_DEDUP_MIN_TEXT = int(os.getenv('CONTENT_DEDUP_MIN_TEXT', '30'))
+# Seconds between saves of the fingerprint index, it is also saved on rotation and shutdown
+CONTENT_DEDUP_SAVE_INTERVAL = float(os.getenv('CONTENT_DEDUP_SAVE_INTERVAL', '300'))
+
+# Digest mode: text posts are sent as one summary per target every interval seconds or max items
+DIGEST_MODE = os.getenv('DIGEST_MODE', 'false').lower() in ('1', 'true', 'yes')
+DIGEST_INTERVAL = float(os.getenv('DIGEST_INTERVAL', '600'))
+DIGEST_MAX_ITEMS = int(os.getenv('DIGEST_MAX_ITEMS', '50'))
+DIGEST_SNIPPET_LENGTH = 100
+
+# Copy mode: posts of channels that do not allow forwarding are re-sent. Parallel media transfers
+# and number of uploaded files remembered, so reposts of the same media are not uploaded again
+COPY_MODE = os.getenv('COPY_MODE', 'true').lower() in ('1', 'true', 'yes')
+COPY_CONCURRENCY = int(os.getenv('COPY_CONCURRENCY', '2'))
+COPY_CACHE_SIZE = int(os.getenv('COPY_CACHE_SIZE', '1000'))
+
+# Mirroring of source edits and deletions: delivered posts are remembered for window seconds, up to
+# max entries (16 bytes each in MESSAGE_MAP_FILE), deletions are sent once per interval seconds
+MIRROR_CHANGES = os.getenv('MIRROR_CHANGES', 'true').lower() in ('1', 'true', 'yes')
+MESSAGE_MAP_FILE = 'message_map.bin'
+MESSAGE_MAP_WINDOW = float(os.getenv('MESSAGE_MAP_WINDOW', '604800'))
+MESSAGE_MAP_MAX_ENTRIES = int(os.getenv('MESSAGE_MAP_MAX_ENTRIES', '1000000'))
+DELETE_BATCH_INTERVAL = float(os.getenv('DELETE_BATCH_INTERVAL', '1'))
+# Forwards can not be edited, an edited post up to this many seconds old is forwarded again and the
+# old forward deleted. It reappears at the bottom of the target and notifies again, 0 disables
+MIRROR_EDIT_REPLACE_WINDOW = float(os.getenv('MIRROR_EDIT_REPLACE_WINDOW', '0'))
+
+# Read acknowledgements: one request per channel every interval seconds or after max pending messages
+MARK_READ = os.getenv('MARK_READ', 'true').lower() in ('1', 'true', 'yes')
+MARK_READ_INTERVAL = float(os.getenv('MARK_READ_INTERVAL', '5'))
+MARK_READ_MAX_PENDING = int(os.getenv('MARK_READ_MAX_PENDING', '50'))
+
+# Rate limits of outgoing calls as (requests per second, burst size)
+RATE_LIMITS = {
+    'forward_messages': (float(os.getenv('RATE_LIMIT_FORWARD', '1.0')), 5),
+    'send_read_acknowledge': (2.0, 10),
+    'get_entity': (2.0, 10),
+    'get_messages': (20.0, 20),
+    'JoinChannelRequest': (0.2, 2),
+    'send_file': (1.0, 5),
+    'edit_message': (1.0, 5),
+    'delete_messages': (1.0, 5),
+    'SaveFilePartRequest': (30.0, 30),
+    'SaveBigFilePartRequest': (30.0, 30),
+}
+DEFAULT_RATE_LIMIT = (5.0, 10)
+# Limit of each method per destination chat
+DESTINATION_RATE_LIMIT = (float(os.getenv('RATE_LIMIT_DESTINATION', '1.0')), 5)
+FLOOD_WAIT_MAX_RETRIES = int(os.getenv('FLOOD_WAIT_MAX_RETRIES', '5'))
+
+# Logging: min level, JSON lines in log file, max lines per second of one DEBUG/INFO call site (0 disables sampling)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FILE = 'bot.log'
+LOG_JSON = os.getenv('LOG_JSON', 'false').lower() in ('1', 'true', 'yes')
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '10'))
+LOG_SAMPLE_BURST = int(os.getenv('LOG_SAMPLE_BURST', '50'))
+
+# Session pool: a FloodWait of at least this many seconds moves channels of the session to other sessions
+SHARD_FLOOD_THRESHOLD = float(os.getenv('SHARD_FLOOD_THRESHOLD', '300'))
+
+# Local HTTP endpoint with metrics in Prometheus text format, disabled when port is 0
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
 # Commands
 CMD_START = '/start'
 CMD_STOP = '/stop'
@@ -32,6 +150,12 @@
 CMD_SET_TARGET = '/set_target'
 CMD_LIST = '/list'
 CMD_STATUS = '/status'
+CMD_ADD_ROUTE = '/add_route'
+CMD_REMOVE_ROUTE = '/remove_route'
+CMD_ROUTES = '/routes'
+CMD_DIGEST = '/digest'
+CMD_STATS = '/stats'
+CMD_PRIORITY = '/priority'
 
 # Message templates
 MSG_BOT_STARTED = "Bot started. Monitoring channels..."
@@ -45,4 +169,15 @@
 MSG_CHANNEL_NOT_FOUND = "Channel not found. Please check if the channel exists and is accessible."
 MSG_NO_TARGET = "Target channel not set."
 MSG_ADDING_ALL_CHANNELS = "Adding all your subscribed channels (this might take a moment)..."
-MSG_ALL_CHANNELS_ADDED = "Added {} channels to monitoring list. Use /list to see them all." 
\ No newline at end of file
+MSG_ALL_CHANNELS_ADDED = "Added {} channels to monitoring list. Use /list to see them all."
+MSG_SYNC_PROGRESS = "Scanned {} dialogs, found {} new channels so far..."
+MSG_SYNC_MISSING = "{} monitored channels are not in your dialogs anymore."
+MSG_ROUTE_USAGE = """Usage: /add_route <source|*> <target> [include=word1,word2] [exclude=word1,word2] [regex="pattern"] [media=photo,video]
+Media types: {}"""
+MSG_ROUTE_ADDED = "Route {} added. Use /routes to see all routes."
+MSG_ROUTE_REMOVED = "Route {} removed."
+MSG_ROUTE_NOT_FOUND = "Route {} not found."
+MSG_DIGEST_MODE = "Digest mode is {}."
+MSG_PRIORITY_USAGE = "Usage: /priority <channel> <1-{}>, channels without priority have 1."
+MSG_PRIORITY_SET = "Priority of channel {} set to {}."
+MSG_NO_ROUTES = "No routes set, all channels are forwarded to the target channel." 
\ No newline at end of file
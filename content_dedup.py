@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import os
+import re
+import struct
+import time
+from array import array
+from typing import List, Optional, Tuple
+from telethon.tl.types import Message, MessageMediaDocument, MessageMediaPhoto
+from loguru import logger
+
+_URL_RE = re.compile(r'https?://\S+|t\.me/\S+|@\w+')
+_NON_WORD_RE = re.compile(r'\W+')
+_HEADER = struct.Struct('<dQ')  # (generation start time, fingerprint count)
+
+def _hash(data: str) -> int:
+    return int.from_bytes(hashlib.blake2b(data.encode(), digest_size=8).digest(), 'big')
+
+def normalize_text(text: str) -> str:
+    """Lowercase text and strip links, mentions and punctuation"""
+    text = _URL_RE.sub(' ', text.lower())
+    return _NON_WORD_RE.sub(' ', text).strip()
+
+def fingerprint(message: Message, min_text_length: int) -> List[int]:
+    """Get 64-bit fingerprints of message text and media"""
+    fingerprints = []
+    media = message.media
+    if isinstance(media, MessageMediaPhoto) and media.photo:
+        fingerprints.append(_hash(f"p:{media.photo.id}:{media.photo.access_hash}"))
+    elif isinstance(media, MessageMediaDocument) and media.document:
+        fingerprints.append(_hash(f"d:{media.document.id}:{media.document.access_hash}"))
+
+    text = normalize_text(message.message or '')
+    # Short texts ("Good morning!") are too common to identify a post
+    if len(text) >= min_text_length:
+        fingerprints.append(_hash(f"t:{text}"))
+    return fingerprints
+
+def for_target(fingerprints: List[int], target_channel_id: int) -> List[int]:
+    """Get fingerprints of content delivered to one target, so other targets still receive it"""
+    return [_hash(f"{target_channel_id}:{fp}") for fp in fingerprints]
+
+class _Table:
+    """Fixed size open addressing set of 64-bit fingerprints, 0 marks a free slot"""
+
+    def __init__(self, bits: int):
+        self._mask = (1 << bits) - 1
+        self._slots = array('Q', bytes(8 << bits))
+        self.count = 0
+
+    def _find(self, fp: int) -> int:
+        # Fingerprints are hashes already, their low bits pick the slot
+        slot = fp & self._mask
+        while self._slots[slot] and self._slots[slot] != fp:
+            slot = (slot + 1) & self._mask
+        return slot
+
+    def add(self, fp: int) -> None:
+        fp = fp or 1
+        slot = self._find(fp)
+        if not self._slots[slot]:
+            self._slots[slot] = fp
+            self.count += 1
+
+    def __contains__(self, fp: int) -> bool:
+        return bool(self._slots[self._find(fp or 1)])
+
+    def values(self) -> array:
+        return array('Q', (fp for fp in self._slots if fp))
+
+class FingerprintIndex:
+    """Time-windowed set of fingerprints split into rotating fixed size generations"""
+
+    def __init__(self, path: str, window: float, max_entries: int, save_interval: float = 300,
+                 generations: int = 4):
+        self._path = path
+        self._save_interval = save_interval
+        self._generations_count = generations
+        self._generation_span = window / generations
+        self._generation_size = max(1, max_entries // generations)
+        # Tables are filled to at most 3/4, memory is 8 bytes per slot whatever the traffic
+        self._bits = max(4, (self._generation_size * 4 // 3).bit_length())
+        self._generations: List[Tuple[float, _Table]] = [(time.time(), _Table(self._bits))]
+        self._dirty = False
+        self._saver: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+
+    def _rotate(self) -> None:
+        """Start new generation when current one is old or full, dropping the oldest"""
+        started, current = self._generations[-1]
+        now = time.time()
+        if now - started < self._generation_span and current.count < self._generation_size:
+            return
+        self._generations.append((now, _Table(self._bits)))
+        del self._generations[:-self._generations_count]
+        self._try_save()
+
+    def _try_save(self) -> None:
+        try:
+            self.save()
+        except OSError as e:
+            logger.error(f"Error saving fingerprint index: {str(e)}")
+
+    def contains(self, fp: int) -> bool:
+        """Check if fingerprint is in index"""
+        return any(fp in generation for _, generation in self._generations)
+
+    def seen(self, fingerprints: List[int]) -> bool:
+        """Check if any fingerprint was already seen"""
+        if not fingerprints:
+            return False
+        seen = any(self.contains(fp) for fp in fingerprints)
+        if seen:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return seen
+
+    def add(self, fingerprints: List[int]) -> None:
+        """Add fingerprints of delivered content"""
+        if not fingerprints:
+            return
+        for fp in fingerprints:
+            self._rotate()
+            self._generations[-1][1].add(fp)
+        self._dirty = True
+
+    def load(self) -> None:
+        """Load generations that are still inside the window"""
+        try:
+            with open(self._path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+
+        deadline = time.time() - self._generation_span * self._generations_count
+        generations = []
+        offset = 0
+        try:
+            while offset < len(data):
+                started, count = _HEADER.unpack_from(data, offset)
+                offset += _HEADER.size
+                values = array('Q')
+                values.frombytes(data[offset:offset + count * values.itemsize])
+                offset += count * values.itemsize
+                if started >= deadline:
+                    table = _Table(self._bits)
+                    for fp in values[:self._generation_size]:
+                        table.add(fp)
+                    generations.append((started, table))
+        except (struct.error, ValueError) as e:
+            logger.warning(f"Ignoring broken fingerprint index {self._path}: {str(e)}")
+            return
+
+        if generations:
+            self._generations = generations[-self._generations_count:]
+        logger.debug(f"Loaded {len(self)} content fingerprints")
+
+    def save(self) -> None:
+        """Write all generations to file"""
+        tmp_path = self._path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            for started, generation in self._generations:
+                values = generation.values()
+                f.write(_HEADER.pack(started, len(values)))
+                values.tofile(f)
+        os.replace(tmp_path, self._path)
+        self._dirty = False
+
+    def start(self) -> None:
+        """Start periodic saving, so a crash loses at most one interval of fingerprints"""
+        if not self._saver:
+            self._saver = asyncio.create_task(self._save_loop())
+
+    async def _save_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._save_interval)
+            if self._dirty:
+                self._try_save()
+
+    async def stop(self) -> None:
+        """Stop periodic saving and save index"""
+        if self._saver:
+            self._saver.cancel()
+            await asyncio.gather(self._saver, return_exceptions=True)
+            self._saver = None
+        self.save()
+
+    def __len__(self) -> int:
+        return sum(generation.count for _, generation in self._generations)
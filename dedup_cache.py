@@ -0,0 +1,64 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Tuple
+
+CacheKey = Tuple[int, Hashable]
+
+class DedupCache:
+    """Bounded LRU cache of processed (channel_id, id) pairs with TTL eviction"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries: "OrderedDict[CacheKey, float]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def contains(self, channel_id: int, item_id: Hashable) -> bool:
+        """Check if item was already processed, counting hits and misses"""
+        key = (channel_id, item_id)
+        added_at = self._entries.get(key)
+        if added_at is not None and time.monotonic() - added_at <= self._ttl:
+            # Recently seen entries are evicted last, TTL still counts from when they were added
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True
+        if added_at is not None:
+            del self._entries[key]
+            self.evictions += 1
+        self.misses += 1
+        return False
+
+    def add(self, channel_id: int, item_id: Hashable) -> None:
+        """Remember item as processed, evicting oldest entries when full"""
+        key = (channel_id, item_id)
+        self._entries[key] = time.monotonic()
+        self._entries.move_to_end(key)
+        self._evict()
+
+    def _evict(self) -> None:
+        """Drop expired entries and keep cache within size limit"""
+        deadline = time.monotonic() - self._ttl
+        while self._entries:
+            key, added_at = next(iter(self._entries.items()))
+            if len(self._entries) <= self._max_size and added_at >= deadline:
+                break
+            del self._entries[key]
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove all entries"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Get cache counters"""
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
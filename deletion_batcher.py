@@ -0,0 +1,48 @@
+from typing import Dict, Iterable, List, Set
+from loguru import logger
+from metrics import metrics
+from periodic_flusher import PeriodicFlusher
+from rate_limiter import RateLimiter
+
+# Telegram deletes at most this many channel messages per request
+MAX_IDS_PER_REQUEST = 100
+
+class DeletionBatcher(PeriodicFlusher):
+    """Coalesces deletions of mirrored posts to one request per target channel"""
+
+    def __init__(self, rate_limiter: RateLimiter, interval: float):
+        self.rate_limiter = rate_limiter
+        self._deletions: Dict[int, Set[int]] = {}  # Target channel -> message ids to delete
+        super().__init__(interval, self._deletions, self._delete)
+
+    def delete(self, target_channel_id: int, message_ids: Iterable[int]) -> None:
+        """Remember messages of target channel to delete with the next request"""
+        pending = self._deletions.setdefault(target_channel_id, set())
+        pending.update(message_ids)
+        if len(pending) >= MAX_IDS_PER_REQUEST:
+            self.send_early(target_channel_id)
+
+    async def _delete(self, target_channel_id: int) -> None:
+        pending = self._deletions.pop(target_channel_id, None)
+        if not pending:
+            return
+        message_ids = sorted(pending)
+        for start in range(0, len(message_ids), MAX_IDS_PER_REQUEST):
+            chunk: List[int] = message_ids[start:start + MAX_IDS_PER_REQUEST]
+            try:
+                await self.rate_limiter.call(
+                    'delete_messages',
+                    target_channel_id,
+                    chunk,
+                    destination=target_channel_id
+                )
+                metrics.mirrored_changes.inc('delete', amount=len(chunk))
+            except Exception as e:
+                logger.warning(f"Could not delete {len(chunk)} messages in channel {target_channel_id}: {str(e)}")
+
+    async def flush(self) -> int:
+        """Delete all pending messages"""
+        count = await super().flush()
+        if count:
+            logger.debug("Deleted mirrored messages in {} channels", count)
+        return count
@@ -0,0 +1,75 @@
+from typing import Awaitable, Callable, List, Tuple
+from telethon import utils
+from telethon.tl.functions.messages import GetDialogsRequest
+from telethon.tl.types import Channel, Dialog, InputPeerEmpty, messages
+from rate_limiter import RateLimiter
+
+DIALOGS_PAGE_SIZE = 100
+MAIN_FOLDER = 0
+ARCHIVE_FOLDER = 1
+
+PageCallback = Callable[[int, List[Channel]], Awaitable[None]]
+
+async def scan_channels(
+    rate_limiter: RateLimiter,
+    folder_id: int,
+    on_page: PageCallback,
+    since: int = 0
+) -> Tuple[int, int]:
+    """Pass broadcast channels of every dialogs page to on_page, returns scanned count and newest date"""
+    offset_date, offset_id, offset_peer = None, 0, InputPeerEmpty()
+    scanned = 0
+    newest = 0
+    while True:
+        result = await rate_limiter.invoke(GetDialogsRequest(
+            offset_date=offset_date,
+            offset_id=offset_id,
+            offset_peer=offset_peer,
+            limit=DIALOGS_PAGE_SIZE,
+            hash=0,
+            exclude_pinned=False,
+            folder_id=folder_id
+        ))
+        if isinstance(result, messages.DialogsNotModified) or not result.dialogs:
+            break
+
+        entities = {utils.get_peer_id(entity): entity for entity in result.chats + result.users}
+        # Only dates of top messages are needed, they are not turned into Message objects
+        dates = {
+            (utils.get_peer_id(message.peer_id), message.id): message.date
+            for message in result.messages
+        }
+
+        channels: List[Channel] = []
+        page_scanned = 0
+        done = False
+        for dialog in result.dialogs:
+            if not isinstance(dialog, Dialog):
+                continue  # Archive folder entry in main list
+            peer_id = utils.get_peer_id(dialog.peer)
+            date = dates.get((peer_id, dialog.top_message))
+            if date:
+                timestamp = int(date.timestamp())
+                newest = max(newest, timestamp)
+                # Dialogs are ordered by last message, except pinned ones on top
+                if timestamp < since and not dialog.pinned:
+                    done = True
+                    break
+            page_scanned += 1
+            entity = entities.get(peer_id)
+            if isinstance(entity, Channel) and entity.broadcast and not entity.left:
+                channels.append(entity)
+
+        scanned += page_scanned
+        await on_page(page_scanned, channels)
+        if done or isinstance(result, messages.Dialogs) or len(result.dialogs) < DIALOGS_PAGE_SIZE:
+            break
+
+        last = result.dialogs[-1]
+        last_peer_id = utils.get_peer_id(last.peer)
+        entity = entities.get(last_peer_id)
+        last_date = dates.get((last_peer_id, last.top_message))
+        if entity is None or last_date is None:
+            break
+        offset_date, offset_id, offset_peer = last_date, last.top_message, utils.get_input_peer(entity)
+    return scanned, newest
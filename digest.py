@@ -0,0 +1,121 @@
+import html
+from typing import Callable, Dict, List, Optional, Tuple
+from telethon import utils
+from telethon.tl.types import Message
+from loguru import logger
+from rate_limiter import RateLimiter
+from config import MAX_MESSAGE_LENGTH
+from periodic_flusher import PeriodicFlusher
+from storage import Storage
+
+DigestItem = Tuple[int, int, str]  # (source_channel_id, message_id, snippet)
+SentCallback = Callable[[int, List[int], int], None]  # (source, message ids, target)
+
+class DigestBuffer(PeriodicFlusher):
+    """Collects text posts per target and sends them as periodic summary messages"""
+
+    def __init__(
+        self,
+        rate_limiter: RateLimiter,
+        storage: Storage,
+        interval: float,
+        max_items: int,
+        snippet_length: int,
+        on_sent: Optional[SentCallback] = None
+    ):
+        self.rate_limiter = rate_limiter
+        self.storage = storage
+        self._max_items = max_items
+        self._snippet_length = snippet_length
+        self._on_sent = on_sent
+        self._items: Dict[int, List[DigestItem]] = {}
+        self.sent = 0
+        super().__init__(interval, self._items, self._send)
+
+    def add(self, target_channel_id: int, source_channel_id: int, message: Message) -> None:
+        """Add text post to digest of target channel, source is the marked chat id"""
+        text = (message.message or '').strip()
+        snippet = text.split('\n', 1)[0][:self._snippet_length] or f"Post {message.id}"
+        items = self._items.setdefault(target_channel_id, [])
+        items.append((source_channel_id, message.id, snippet))
+        if len(items) >= self._max_items:
+            self.send_early(target_channel_id)
+
+    def _link(self, channel_id: int, message_id: int) -> str:
+        username = self.storage.get_channel_meta(channel_id).get('username')
+        if username:
+            return f"https://t.me/{username}/{message_id}"
+        return f"https://t.me/c/{channel_id}/{message_id}"
+
+    def _compose(self, items: List[DigestItem]) -> List[Tuple[str, List[DigestItem]]]:
+        """Build digest messages grouped by source channel, split at message size limit, with their items"""
+        by_source: Dict[int, List[DigestItem]] = {}
+        for item in items:
+            by_source.setdefault(item[0], []).append(item)
+
+        messages = []
+        current = ""
+        current_items: List[DigestItem] = []
+        for source_channel_id, channel_items in by_source.items():
+            channel_id = utils.resolve_id(source_channel_id)[0]
+            meta = self.storage.get_channel_meta(channel_id)
+            header = f"<b>{html.escape(meta.get('title') or meta.get('username') or str(channel_id))}</b>"
+            lines = [(header, None)] + [
+                (f'• <a href="{self._link(channel_id, item[1])}">{html.escape(item[2])}</a>', item)
+                for item in channel_items
+            ]
+            separator = "\n\n" if current else ""
+            for line, item in lines:
+                if current and len(current) + len(separator) + len(line) > MAX_MESSAGE_LENGTH:
+                    messages.append((current, current_items))
+                    current_items = []
+                    # Repeat channel name on top of continued block
+                    current = header if item is not None else ""
+                    separator = "\n" if current else ""
+                current = f"{current}{separator}{line}"
+                separator = "\n"
+                if item is not None:
+                    current_items.append(item)
+        if current:
+            messages.append((current, current_items))
+        return messages
+
+    async def _send(self, target_channel_id: int) -> None:
+        items = self._items.pop(target_channel_id, None)
+        if not items:
+            return
+        sent_items: List[DigestItem] = []
+        try:
+            for text, text_items in self._compose(items):
+                await self.rate_limiter.call(
+                    'send_message',
+                    target_channel_id,
+                    text,
+                    parse_mode='html',
+                    link_preview=False,
+                    destination=target_channel_id
+                )
+                self.sent += 1
+                sent_items.extend(text_items)
+            logger.info(f"Sent digest of {len(items)} posts to target channel {target_channel_id}")
+        except Exception as e:
+            # Posts are not in the outbox, keep them for the next digest ahead of newer ones
+            sent = set(sent_items)
+            unsent = [item for item in items if item not in sent]
+            self._items[target_channel_id] = unsent + self._items.get(target_channel_id, [])
+            logger.error(
+                f"Error sending digest to {target_channel_id}, {len(unsent)} posts kept for next digest: {str(e)}"
+            )
+
+        if self._on_sent and sent_items:
+            message_ids: Dict[int, List[int]] = {}
+            for source_channel_id, message_id, _ in sent_items:
+                message_ids.setdefault(source_channel_id, []).append(message_id)
+            for source_channel_id, ids in message_ids.items():
+                self._on_sent(source_channel_id, sorted(ids), target_channel_id)
+
+    async def stop(self) -> None:
+        """Stop periodic sending, buffered posts are sent first"""
+        await super().stop()
+        if self._items:
+            logger.warning(f"{sum(map(len, self._items.values()))} digest posts could not be sent before stop")
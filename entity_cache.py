@@ -0,0 +1,145 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional
+from telethon.tl.types import Channel, PeerChannel
+from loguru import logger
+from rate_limiter import RateLimiter
+
+RESOLVE_CHUNK_SIZE = 100
+
+class EntityCache:
+    """Persistent cache of channel names and usernames with TTL refresh"""
+
+    def __init__(self, rate_limiter: RateLimiter, path: str, ttl: float, concurrency: int):
+        self.rate_limiter = rate_limiter
+        self._path = path
+        self._ttl = ttl
+        self._concurrency = concurrency
+        self._entries: Dict[int, Dict[str, Any]] = {}
+        self._usernames: Dict[str, int] = {}
+        self._dirty = False
+        self.load()
+
+    def load(self) -> None:
+        """Load cached entities from file"""
+        try:
+            with open(self._path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError as e:
+            logger.warning(f"Ignoring broken entity cache {self._path}: {str(e)}")
+            return
+        self._entries = {int(k): v for k, v in data.items()}
+        self._usernames = {
+            entry['username'].lower(): channel_id
+            for channel_id, entry in self._entries.items()
+            if entry.get('username')
+        }
+        logger.debug(f"Loaded {len(self._entries)} cached entities")
+
+    def save(self) -> None:
+        """Save cache to file if it changed"""
+        if not self._dirty:
+            return
+        tmp_path = self._path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({str(k): v for k, v in self._entries.items()}, f)
+        os.replace(tmp_path, self._path)
+        self._dirty = False
+
+    def put(self, channel: Channel) -> None:
+        """Cache channel entity"""
+        username = getattr(channel, 'username', None)
+        old = self._entries.get(channel.id)
+        if old and old.get('username'):
+            self._usernames.pop(old['username'].lower(), None)
+        self._entries[channel.id] = {
+            'title': channel.title,
+            'username': username,
+            'joined': not getattr(channel, 'left', False),
+            'updated': time.time()
+        }
+        if username:
+            self._usernames[username.lower()] = channel.id
+        self._dirty = True
+
+    def set_joined(self, channel_id: int) -> None:
+        """Remember that account joined channel"""
+        entry = self._entries.get(channel_id)
+        if entry and not entry.get('joined'):
+            entry['joined'] = True
+            self._dirty = True
+
+    def _fresh(self, channel_id: int) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(channel_id)
+        if entry and time.time() - entry['updated'] <= self._ttl:
+            return entry
+        return None
+
+    def get(self, channel_id: int) -> Optional[Dict[str, Any]]:
+        """Get cached entry of channel if it is still fresh"""
+        return self._fresh(channel_id)
+
+    def get_by_username(self, username: str) -> Optional[int]:
+        """Get id of channel by cached username"""
+        channel_id = self._usernames.get(username.lower())
+        if channel_id is not None and self._fresh(channel_id):
+            return channel_id
+        return None
+
+    @staticmethod
+    def display_name(entry: Dict[str, Any]) -> str:
+        """Get name shown for cached channel"""
+        return entry.get('username') or entry.get('title') or '?'
+
+    async def resolve_names(self, channel_ids: Iterable[int]) -> Dict[int, str]:
+        """Get display names of channels, fetching stale entries concurrently"""
+        semaphore = asyncio.Semaphore(self._concurrency)
+        names: Dict[int, str] = {}
+
+        async def resolve(chunk: List[int]) -> None:
+            async with semaphore:
+                try:
+                    # A list of channels is fetched with a single request
+                    channels = await self.rate_limiter.call(
+                        'get_entity', [PeerChannel(channel_id) for channel_id in chunk]
+                    )
+                except Exception as e:
+                    error = e
+                    channels = None
+            if channels is None:
+                if len(chunk) > 1:
+                    # One unresolvable id fails the whole request, so the chunk is split
+                    # until the failing channel is isolated
+                    middle = len(chunk) // 2
+                    await asyncio.gather(resolve(chunk[:middle]), resolve(chunk[middle:]))
+                    return
+                logger.error(f"Error getting info of channel {chunk[0]}: {str(error)}")
+                # Fall back to expired entry rather than dropping the channel
+                entry = self._entries.get(chunk[0])
+                if entry:
+                    names[chunk[0]] = self.display_name(entry)
+                return
+            for channel in channels:
+                # Banned or private channels come back as ChannelForbidden without username
+                self.put(channel)
+                names[channel.id] = getattr(channel, 'username', None) or channel.title
+
+        misses = []
+        for channel_id in channel_ids:
+            entry = self._fresh(channel_id)
+            if entry:
+                names[channel_id] = self.display_name(entry)
+            else:
+                misses.append(channel_id)
+
+        if misses:
+            await asyncio.gather(*(
+                resolve(misses[i:i + RESOLVE_CHUNK_SIZE])
+                for i in range(0, len(misses), RESOLVE_CHUNK_SIZE)
+            ))
+            self.save()
+        return names
@@ -0,0 +1,323 @@
+import asyncio
+import heapq
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+from loguru import logger
+from metrics import metrics
+from outbox import Outbox
+
+BatchKey = Tuple[int, int]  # (source_channel_id, target_channel_id)
+ForwardCallback = Callable[[int, List[int], int], Awaitable[None]]
+WeightCallback = Callable[[int], int]
+DropCallback = Callable[[int, List[int], int], None]  # (source, message ids, target)
+ResumeCallback = Callable[[int, List[int]], None]
+
+OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest')
+# Longest wait before retrying a failed batch, retry delay doubles after every attempt
+MAX_RETRY_DELAY = 300.0
+
+class _Batch:
+    """Message ids of one source channel waiting to be forwarded together"""
+
+    def __init__(self, created: Optional[float] = None):
+        self.message_ids: List[int] = []
+        self.entry_ids: List[int] = []  # Outbox entries covered by this batch
+        self.created = created or time.time()  # When its oldest message was queued
+        self.attempts = 0
+
+class ForwardQueue:
+    """Coalesces messages per source channel and forwards them from a worker pool"""
+
+    def __init__(
+        self,
+        on_forward: ForwardCallback,
+        workers: int,
+        window: float,
+        max_batch: int = 100,
+        outbox: Optional[Outbox] = None,
+        weight: Optional[WeightCallback] = None,
+        max_depth: int = 1000,
+        overflow: str = 'drop_oldest',
+        max_attempts: int = 5,
+        retry_delay: float = 5.0,
+        max_age: float = 86400,
+        on_drop: Optional[DropCallback] = None,
+        on_resume: Optional[ResumeCallback] = None
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow}, use one of {', '.join(OVERFLOW_POLICIES)}")
+        self._on_forward = on_forward
+        self._workers_count = max(1, workers)
+        self._window = window
+        self._max_batch = max_batch
+        self._outbox = outbox
+        self._weight = weight
+        self._max_depth = max_depth
+        self._overflow = overflow
+        self._max_attempts = max(1, max_attempts)
+        self._retry_delay = retry_delay
+        self._max_age = max_age
+        self._on_drop = on_drop
+        self._on_resume = on_resume
+        self._pending: Dict[BatchKey, _Batch] = {}
+        self._timers: Dict[BatchKey, asyncio.Task] = {}
+        self._ready: Dict[BatchKey, Deque[_Batch]] = {}
+        self._depth: Dict[BatchKey, int] = {}  # Queued messages per key, pending and ready
+        # Workers serve per-source queues by weighted fair queueing, so a burst of one channel
+        # does not delay quiet ones. Keys ordered by virtual finish time, one request per key in flight
+        self._heap: List[Tuple[float, int, BatchKey]] = []
+        self._scheduled: Set[BatchKey] = set()
+        self._busy: Set[BatchKey] = set()
+        self._finish: Dict[BatchKey, float] = {}
+        self._virtual_time = 0.0
+        self._sequence = 0
+        self._runnable = asyncio.Semaphore(0)
+        self._workers: List[asyncio.Task] = []
+        # Failed batches waiting for their retry, their key stays busy so later posts do not overtake them
+        self._retries: Set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        """Start forwarding workers and resume forwards left in outbox"""
+        if self._workers:
+            return
+        self._runnable = asyncio.Semaphore(len(self._heap))
+        for n in range(self._workers_count):
+            self._workers.append(asyncio.create_task(self._worker(n)))
+        logger.info(f"Started {self._workers_count} forwarding workers")
+
+        if self._outbox:
+            self._outbox.start()
+            entries = self._outbox.pending()
+            deadline = time.time() - self._max_age
+            expired = [entry[0] for entry in entries if entry[4] < deadline]
+            if expired:
+                # Posts that kept failing or waited too long are not worth sending anymore
+                self._outbox.ack(expired)
+                metrics.forwarded_messages.inc('expired', amount=sum(
+                    len(entry[2]) for entry in entries if entry[4] < deadline
+                ))
+                logger.warning(f"Dropped {len(expired)} outbox forwards older than {self._max_age:.0f}s")
+            entries = [entry for entry in entries if entry[4] >= deadline]
+            for entry_id, source_channel_id, message_ids, target_channel_id, created in entries:
+                self._add((source_channel_id, target_channel_id), message_ids, entry_id, created)
+                if self._on_resume:
+                    self._on_resume(source_channel_id, message_ids)
+            if entries:
+                logger.info(f"Resumed {len(entries)} pending forwards from outbox")
+
+    async def put(self, source_channel_id: int, message_ids: List[int], target_channel_id: int) -> None:
+        """Add messages to pending batch of their source channel"""
+        key = (source_channel_id, target_channel_id)
+        if not self._make_room(key, message_ids):
+            return
+        entry_id = None
+        if self._outbox:
+            entry_id = self._outbox.add(source_channel_id, message_ids, target_channel_id)
+        self._add(key, message_ids, entry_id)
+
+    def _make_room(self, key: BatchKey, message_ids: List[int]) -> bool:
+        """Apply overflow policy when source queue is full, returns False if new messages are dropped"""
+        depth = self._depth.get(key, 0)
+        count = len(message_ids)
+        if depth + count <= self._max_depth:
+            return True
+
+        ready = self._ready.get(key)
+        if self._overflow == 'drop_newest' or not ready:
+            self._drop(key, message_ids, [])
+            return False
+
+        # Oldest posts are the least relevant in a feed, make room for the new ones
+        dropped: List[int] = []
+        entry_ids: List[int] = []
+        while ready and depth - len(dropped) + count > self._max_depth:
+            batch = ready.popleft()
+            dropped.extend(batch.message_ids)
+            entry_ids.extend(batch.entry_ids)
+        if not ready:
+            del self._ready[key]
+        self._depth[key] = depth - len(dropped)
+        self._drop(key, dropped, entry_ids)
+        return True
+
+    def _drop(self, key: BatchKey, message_ids: List[int], entry_ids: List[int]) -> None:
+        if self._outbox and entry_ids:
+            self._outbox.ack(entry_ids)
+        metrics.updates_filtered.inc('queue_overflow', amount=len(message_ids))
+        logger.info("Queue of channel {} is full, dropped {} messages", key[0], len(message_ids))
+        self._dropped(key, message_ids)
+
+    def _dropped(self, key: BatchKey, message_ids: List[int]) -> None:
+        """Notify about messages that will not be forwarded"""
+        if self._on_drop and message_ids:
+            self._on_drop(key[0], message_ids, key[1])
+
+    def _add(self, key: BatchKey, message_ids: List[int], entry_id: Optional[int],
+             created: Optional[float] = None) -> None:
+        batch = self._pending.get(key)
+        self._depth[key] = self._depth.get(key, 0) + len(message_ids)
+
+        # Never split a group of messages (album) between two batches
+        if batch and len(batch.message_ids) + len(message_ids) > self._max_batch:
+            self._dispatch(key)
+            batch = None
+        if batch is None:
+            batch = self._pending[key] = _Batch(created)
+
+        batch.message_ids.extend(message_ids)
+        if entry_id is not None:
+            batch.entry_ids.append(entry_id)
+
+        if len(batch.message_ids) >= self._max_batch:
+            self._dispatch(key)
+        elif key not in self._timers:
+            self._timers[key] = asyncio.create_task(self._dispatch_later(key))
+
+    async def _dispatch_later(self, key: BatchKey) -> None:
+        """Dispatch batch once coalescing window is over"""
+        try:
+            await asyncio.sleep(self._window)
+        except asyncio.CancelledError:
+            return
+        self._timers.pop(key, None)
+        self._dispatch(key)
+
+    def _dispatch(self, key: BatchKey) -> None:
+        """Move pending batch to ready queue of its source"""
+        timer = self._timers.pop(key, None)
+        if timer and timer is not asyncio.current_task() and not timer.done():
+            timer.cancel()
+
+        batch = self._pending.pop(key, None)
+        if not batch:
+            return
+        if not self._workers:
+            logger.warning(f"Forwarding workers not started, {len(batch.message_ids)} messages from {key[0]} not sent")
+            self._depth[key] -= len(batch.message_ids)
+            self._dropped(key, batch.message_ids)
+            return
+
+        self._ready.setdefault(key, deque()).append(batch)
+        self._schedule(key)
+        logger.debug("Queued batch of {} messages from channel {}", len(batch.message_ids), key[0])
+
+    def _schedule(self, key: BatchKey) -> None:
+        """Make key runnable, its turn comes after 1/weight of virtual time"""
+        if key in self._scheduled or key in self._busy or not self._ready.get(key):
+            return
+        weight = max(1, self._weight(key[0])) if self._weight else 1
+        # Sources idle for a while start at current virtual time instead of saved up credit
+        finish = max(self._finish.get(key, 0.0), self._virtual_time) + 1 / weight
+        self._finish[key] = finish
+        self._sequence += 1
+        heapq.heappush(self._heap, (finish, self._sequence, key))
+        self._scheduled.add(key)
+        self._runnable.release()
+
+    def _take(self) -> Tuple[BatchKey, Optional[_Batch]]:
+        """Take batches of key with earliest finish time, merged up to max batch size"""
+        finish, _, key = heapq.heappop(self._heap)
+        self._scheduled.discard(key)
+        self._busy.add(key)
+        self._virtual_time = max(self._virtual_time, finish)
+
+        ready = self._ready.get(key)
+        if not ready:
+            # Everything was dropped by overflow policy while waiting
+            return key, None
+        batch = ready.popleft()
+        # Under overload batches of a chatty source are coalesced into fewer requests
+        while ready and len(batch.message_ids) + len(ready[0].message_ids) <= self._max_batch:
+            merged = ready.popleft()
+            batch.message_ids.extend(merged.message_ids)
+            batch.entry_ids.extend(merged.entry_ids)
+            batch.created = min(batch.created, merged.created)
+        if not ready:
+            del self._ready[key]
+        self._depth[key] -= len(batch.message_ids)
+        return key, batch
+
+    def _release(self, key: BatchKey) -> None:
+        self._busy.discard(key)
+        if self._ready.get(key):
+            self._schedule(key)
+        elif not self._depth.get(key) and key not in self._pending:
+            self._depth.pop(key, None)
+            self._finish.pop(key, None)
+
+    async def _worker(self, n: int) -> None:
+        """Forward batches in weighted fair order"""
+        while True:
+            await self._runnable.acquire()
+            key, batch = self._take()
+            source_channel_id, target_channel_id = key
+            if batch is None:
+                self._release(key)
+                continue
+            try:
+                message_ids = sorted(set(batch.message_ids))
+                await self._on_forward(source_channel_id, message_ids, target_channel_id)
+                if self._outbox:
+                    self._outbox.ack(batch.entry_ids)
+                metrics.forwards.inc('ok')
+                metrics.forwarded_messages.inc('ok', amount=len(message_ids))
+            except Exception as e:
+                metrics.forwards.inc('failed')
+                batch.attempts += 1
+                if batch.attempts < self._max_attempts and time.time() - batch.created < self._max_age:
+                    delay = min(self._retry_delay * 2 ** (batch.attempts - 1), MAX_RETRY_DELAY)
+                    logger.warning(
+                        f"Worker {n} failed to forward {len(batch.message_ids)} messages "
+                        f"from {source_channel_id}, retrying in {delay:.1f}s: {str(e)}"
+                    )
+                    task = asyncio.create_task(self._retry_later(key, batch, delay))
+                    self._retries.add(task)
+                    task.add_done_callback(self._retries.discard)
+                    continue  # Key is released once batch is back in its queue
+                if self._outbox:
+                    self._outbox.ack(batch.entry_ids)
+                metrics.forwarded_messages.inc('failed', amount=len(batch.message_ids))
+                logger.error(
+                    f"Worker {n} gave up forwarding {len(batch.message_ids)} messages "
+                    f"from {source_channel_id} after {batch.attempts} attempts: {str(e)}"
+                )
+                self._dropped(key, batch.message_ids)
+            self._release(key)
+
+    async def _retry_later(self, key: BatchKey, batch: _Batch, delay: float) -> None:
+        """Put failed batch back in front of its queue after delay"""
+        await asyncio.sleep(delay)
+        self._ready.setdefault(key, deque()).appendleft(batch)
+        self._depth[key] = self._depth.get(key, 0) + len(batch.message_ids)
+        self._release(key)
+
+    def qsize(self) -> int:
+        """Get number of batches waiting for a worker"""
+        return sum(len(ready) for ready in self._ready.values())
+
+    def pending_messages(self) -> int:
+        """Get number of messages waiting in coalescing window"""
+        return sum(len(batch.message_ids) for batch in self._pending.values())
+
+    async def stop(self) -> None:
+        """Stop workers, unsent batches stay in outbox for next start"""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        self._pending.clear()
+
+        for task in self._workers + list(self._retries):
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._retries, return_exceptions=True)
+        self._retries.clear()
+        self._workers.clear()
+        self._ready.clear()
+        self._depth.clear()
+        self._heap.clear()
+        self._scheduled.clear()
+        self._busy.clear()
+        self._finish.clear()
+
+        if self._outbox:
+            await self._outbox.close()
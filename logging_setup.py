@@ -0,0 +1,46 @@
+import sys
+import time
+from typing import Dict, Tuple
+from loguru import logger
+from metrics import metrics
+
+class LogSampler:
+    """Rate limits log lines below WARNING per call site, dropped lines are counted"""
+
+    def __init__(self, rate: float, burst: int):
+        self._rate = rate
+        self._burst = burst
+        # (module, line) -> (tokens, last update)
+        self._sites: Dict[Tuple[str, int], Tuple[float, float]] = {}
+        self._last_record = None
+        self._last_decision = True
+
+    def __call__(self, record) -> bool:
+        # Every sink calls the filter, decide once per record
+        if record is self._last_record:
+            return self._last_decision
+        self._last_record = record
+        self._last_decision = self._allow(record)
+        return self._last_decision
+
+    def _allow(self, record) -> bool:
+        if self._rate <= 0 or record['level'].no >= 30:
+            return True
+        site = (record['name'], record['line'])
+        now = time.monotonic()
+        tokens, updated = self._sites.get(site, (self._burst, now))
+        tokens = min(self._burst, tokens + (now - updated) * self._rate)
+        if tokens < 1:
+            self._sites[site] = (tokens, now)
+            metrics.log_lines_dropped.inc()
+            return False
+        self._sites[site] = (tokens - 1, now)
+        return True
+
+def setup_logging(level: str, path: str, json_format: bool, sample_rate: float, sample_burst: int) -> None:
+    """Log to stderr and rotating file from a background writer thread"""
+    sampler = LogSampler(sample_rate, sample_burst)
+    logger.remove()
+    # enqueue hands records to a writer thread, so slow disks never block the event loop
+    logger.add(sys.stderr, level=level, filter=sampler, enqueue=True)
+    logger.add(path, level=level, filter=sampler, enqueue=True, rotation="1 MB", serialize=json_format)
@@ -1,37 +1,96 @@
+import time
+_STARTED = time.monotonic()
+
 import asyncio
-from telethon import TelegramClient, events
-from telethon.tl.types import Channel
+import glob
+import os
+from telethon import TelegramClient, utils
 from loguru import logger
 import signal
 import sys
 from config import (
-    API_ID, API_HASH, SESSION_NAME, PHONE_NUMBER,
+    API_ID, API_HASH, SESSIONS_DIR, SESSION_NAME, PHONE_NUMBER,
     DEVICE_MODEL, SYSTEM_VERSION, APP_VERSION,
-    MSG_BOT_STOPPED
+    MSG_BOT_STOPPED, RATE_LIMITS, DEFAULT_RATE_LIMIT,
+    DESTINATION_RATE_LIMIT, FLOOD_WAIT_MAX_RETRIES,
+    ENTITY_CACHE_FILE, ENTITY_CACHE_TTL, ENTITY_RESOLVE_CONCURRENCY,
+    METRICS_HOST, METRICS_PORT, SHARD_FLOOD_THRESHOLD, USE_UVLOOP, EARLY_UPDATES_MAX,
+    LOG_LEVEL, LOG_FILE, LOG_JSON, LOG_SAMPLE_RATE, LOG_SAMPLE_BURST
 )
 from storage import Storage
 from command_handler import CommandHandler
 from message_handler import MessageHandler
+from rate_limiter import RateLimiter
+from entity_cache import EntityCache
+from routing import Router
+from session_pool import Session, SessionPool
+from metrics import MetricsServer, metrics
+from logging_setup import setup_logging
+
+class AggregatorClient(TelegramClient):
+    """Telegram client that notifies about automatic reconnects"""
+    on_reconnect = None
 
-logger.add("bot.log", rotation="1 MB")
+    async def _handle_auto_reconnect(self):
+        await super()._handle_auto_reconnect()
+        if self.on_reconnect:
+            await self.on_reconnect()
 
 class ChannelAggregator:
     def __init__(self):
-        # Initialize client with custom device info
-        self.client = TelegramClient(
-            SESSION_NAME,
+        os.makedirs(SESSIONS_DIR, exist_ok=True)
+        self.client = self._create_client(SESSION_NAME)
+        self.rate_limiter = self._create_rate_limiter(self.client)
+        self.storage = Storage()
+        # Primary session handles commands, secondary sessions only monitor and forward
+        self.pool = SessionPool(self.storage, SHARD_FLOOD_THRESHOLD)
+        self.pool.add(Session(os.path.basename(SESSION_NAME), self.client, self.rate_limiter, primary=True))
+        self.pool.restore()
+        self.router = Router(self.storage)
+        self.entity_cache = EntityCache(
+            self.rate_limiter, ENTITY_CACHE_FILE, ENTITY_CACHE_TTL, ENTITY_RESOLVE_CONCURRENCY
+        )
+        self.command_handler = CommandHandler(
+            self.client, self.storage, self.rate_limiter, self.entity_cache, self.router,
+            on_start=self._on_start, pool=self.pool
+        )
+        self.message_handler = MessageHandler(self.rate_limiter, self.storage, self.router, self.pool)
+        self.client.on_reconnect = self._catch_up
+        self.metrics_server = MetricsServer(METRICS_HOST, METRICS_PORT) if METRICS_PORT else None
+        self._setup_signal_handlers()
+        self.is_stopping = False
+        self._loop = None
+        self._shutdown_task = None
+        self._catching_up = False
+        # Updates that arrive while starting are handled once startup is done
+        self._ready = False
+        self._early_updates = []
+
+    @staticmethod
+    def _create_client(session: str) -> AggregatorClient:
+        """Create client with custom device info"""
+        return AggregatorClient(
+            session,
             API_ID,
             API_HASH,
             device_model=DEVICE_MODEL,
             system_version=SYSTEM_VERSION,
             app_version=APP_VERSION,
-            system_lang_code='en'
+            system_lang_code='en',
+            # FloodWait is handled by the rate limiter instead of sleeping inside the client
+            flood_sleep_threshold=0
+        )
+
+    @staticmethod
+    def _create_rate_limiter(client: TelegramClient) -> RateLimiter:
+        """Create rate limiter, limits are per account"""
+        return RateLimiter(
+            client,
+            RATE_LIMITS,
+            DEFAULT_RATE_LIMIT,
+            DESTINATION_RATE_LIMIT,
+            FLOOD_WAIT_MAX_RETRIES
         )
-        self.storage = Storage()
-        self.command_handler = CommandHandler(self.client, self.storage)
-        self.message_handler = MessageHandler(self.client)
-        self._setup_signal_handlers()
-        self.is_stopping = False
 
     def _setup_signal_handlers(self):
         """Setup handlers for graceful shutdown"""
@@ -46,39 +105,113 @@ def _handle_stop_signal(self, signum, frame):
         
         logger.info("Received stop signal, shutting down gracefully...")
         self.is_stopping = True
-        # Instead of creating a new task, we set a flag that will be checked
-        self.client.disconnect()
+        if not self._loop:
+            sys.exit(0)
+        # Shutdown runs while clients are still connected, so queued posts and digests are sent.
+        # It disconnects the clients at the end, which ends run_until_disconnected
+        self._loop.call_soon_threadsafe(self._begin_shutdown)
+
+    def _begin_shutdown(self):
+        """Start graceful shutdown once"""
+        if not self._shutdown_task:
+            self._shutdown_task = asyncio.ensure_future(self._shutdown())
+        return self._shutdown_task
+
+    async def _start_session(self, name: str) -> None:
+        """Connect secondary session and add it to the pool"""
+        client = self._create_client(os.path.join(SESSIONS_DIR, name))
+        rate_limiter = self._create_rate_limiter(client)
+        try:
+            await client.connect()
+            if not await client.is_user_authorized():
+                logger.warning(f"Skipping session {name}, it is not authorized")
+                await client.disconnect()
+                return
+            # Dialogs give the session access hashes of the target and its channels
+            dialogs = await rate_limiter.call('get_dialogs')
+        except Exception as e:
+            logger.error(f"Error starting session {name}: {str(e)}")
+            await client.disconnect()
+            return
+        client.on_reconnect = self._catch_up
+        session = Session(name, client, rate_limiter)
+        self.pool.add(session)
+        # Channels the account already joined are moved to it without waiting for a join
+        self.pool.set_members(session, (dialog.entity.id for dialog in dialogs if dialog.is_channel))
+        self._register_message_handler(session)
+        logger.info(f"Started session {name}")
+
+    async def _start_sessions(self):
+        """Start every session found in sessions directory and spread channels across them"""
+        primary = os.path.basename(SESSION_NAME)
+        names = [
+            os.path.splitext(os.path.basename(path))[0]
+            for path in sorted(glob.glob(os.path.join(SESSIONS_DIR, '*.session')))
+        ]
+        await asyncio.gather(*(self._start_session(name) for name in names if name != primary))
+        self.pool.rebalance()
+
+    async def _on_start(self):
+        """Resume forwarding after /start and forward messages missed meanwhile"""
+        self.message_handler.start()
+        await self._catch_up()
+
+    async def _catch_up(self):
+        """Forward messages missed while offline or disconnected"""
+        if self._catching_up or not self.command_handler.is_running or not self.router.has_targets():
+            return
+        self._catching_up = True
+        try:
+            await self.message_handler.catch_up(self.storage.get_last_ids())
+        except Exception as e:
+            logger.error(f"Error catching up missed messages: {str(e)}")
+        finally:
+            self._catching_up = False
 
     async def _shutdown(self):
         """Perform graceful shutdown"""
         try:
             # Notify user about shutdown
             if self.client.is_connected():
-                me = await self.client.get_me()
-                await self.client.send_message('me', MSG_BOT_STOPPED)
+                await self.rate_limiter.call('send_message', 'me', MSG_BOT_STOPPED)
             
             # Stop command handler
             self.command_handler.is_running = False
+            await self.pool.stop()
             
-            # Clear message handler cache
+            # Stop forwarding workers and clear message handler cache
+            await self.message_handler.stop()
             self.message_handler.clear_cache()
-            
-            # Disconnect client
-            await self.client.disconnect()
+            self.storage.save()
+            if self.metrics_server:
+                await self.metrics_server.stop()
             logger.info("Bot stopped gracefully")
             
         except Exception as e:
             logger.error(f"Error during shutdown: {str(e)}")
+        finally:
+            # Disconnect clients only now, stopping the handler still sends pending posts
+            for session in self.pool.sessions():
+                await session.client.disconnect()
+            await logger.complete()
 
     async def start(self):
         """Start the bot"""
+        sessions = None
+        self._loop = asyncio.get_running_loop()
         try:
+            # Handlers are in place before the first update can arrive
+            await self._register_message_handlers()
+            # Secondary sessions do not depend on the primary one and connect meanwhile
+            sessions = asyncio.create_task(self._start_sessions())
+
             if not self.client.is_connected():
                 await self.client.connect()
 
             if not await self.client.is_user_authorized():
                 if not PHONE_NUMBER:
                     logger.error("Phone number not found in configuration!")
+                    sessions.cancel()
                     return
                 
                 try:
@@ -103,64 +236,110 @@ async def start(self):
                     logger.info("Successfully signed in!")
                 except Exception as e:
                     logger.error(f"Error during authentication: {str(e)}")
+                    sessions.cancel()
                     return
 
-            await self.command_handler.setup()
-            await self._register_message_handler()
-            
-            logger.info("Bot started")
+            # Outbox forwards are resumed only if the bot was left running, otherwise on /start
+            if self.command_handler.is_running:
+                self.message_handler.start()
+            await asyncio.gather(self.command_handler.setup(), sessions, self._start_metrics_server())
+            await self._handle_early_updates()
+            if self.command_handler.is_running:
+                asyncio.create_task(self._catch_up())
+
+            logger.info(f"Bot started in {time.monotonic() - _STARTED:.2f}s")
             
             try:
                 await self.client.run_until_disconnected()
             finally:
                 if self.is_stopping:
-                    await self._shutdown()
+                    await self._begin_shutdown()
                 
         except Exception as e:
+            if sessions:
+                sessions.cancel()
             if not self.is_stopping:
                 logger.error(f"Unexpected error: {str(e)}")
-                await self._shutdown()
+            await self._begin_shutdown()
 
-    async def _register_message_handler(self):
-        """Register handler for new messages in channels"""
-        @self.client.on(events.NewMessage)
-        async def handle_new_message(event):
-            try:
-                # Log basic message info
-                logger.debug(f"Received message {event.message.id} from chat {event.message.chat_id}")
-                
-                if not self.command_handler.is_running:
-                    logger.debug("Bot is not running, skipping message")
-                    return
+    async def _start_metrics_server(self):
+        """Start metrics endpoint if enabled"""
+        if not self.metrics_server:
+            return
+        try:
+            await self.metrics_server.start()
+        except OSError as e:
+            logger.error(f"Could not start metrics endpoint: {str(e)}")
 
-                # Check if message is from channel
-                if not event.is_channel:
-                    logger.debug("Message is not from channel, skipping")
-                    return
-                
-                channel_id = event.message.peer_id.channel_id
-                logger.debug(f"Message is from channel {channel_id}")
-                
-                # Check if channel is monitored
-                monitored_channels = self.storage.get_channels()
-                if channel_id not in monitored_channels:
-                    logger.debug(f"Channel {channel_id} is not in monitored list: {monitored_channels}")
-                    return
+    def _register_message_handler(self, session: Session):
+        """Register handlers for new, edited and deleted messages in channels of session"""
+        # Only channels assigned to the session pass its chats filter
+        session.client.on(session.channel_filter)(self._handle_new_message)
+        session.client.on(session.edit_filter)(self._handle_edited_message)
+        session.client.on(session.delete_filter)(self._handle_deleted_messages)
 
-                # Check if target channel is set
-                target_channel = self.storage.get_target()
-                if not target_channel:
-                    logger.warning("Target channel not set")
-                    return
+    async def _register_message_handlers(self):
+        """Register handler for new messages in channels of every started session"""
+        for session in self.pool.sessions():
+            self._register_message_handler(session)
 
-                # Process message
-                try:
-                    logger.debug(f"Processing message {event.message.id} from channel {channel_id} to target {target_channel}")
-                    await self.message_handler.process_message(event.message, target_channel)
-                except Exception as e:
-                    logger.error(f"Error processing message {event.message.id}: {str(e)}")
+    async def _handle_early_updates(self):
+        """Handle updates buffered during startup"""
+        self._ready = True
+        updates, self._early_updates = self._early_updates, []
+        if updates:
+            logger.info(f"Handling {len(updates)} updates received during startup")
+        for event in updates:
+            await self._handle_new_message(event)
+
+    async def _handle_new_message(self, event):
+        """Handle new message in monitored channel"""
+        if not self._ready:
+            if len(self._early_updates) < EARLY_UPDATES_MAX:
+                self._early_updates.append(event)
+            else:
+                metrics.updates_filtered.inc('startup_overflow')
+            return
+        try:
+            metrics.updates_received.inc()
+            channel_id = event.message.peer_id.channel_id
+            if not self.command_handler.is_running:
+                logger.debug("Bot is not running, skipping message")
+                metrics.updates_filtered.inc('not_running')
+                if self.command_handler.paused:
+                    # Posts sent after /stop are skipped for good, catch-up on /start must not send them
+                    self.storage.update_last_id(channel_id, event.message.id)
+                return
+
+            # Check if target channel or routes are set
+            if not self.router.has_targets():
+                logger.warning("Target channel not set")
+                metrics.updates_filtered.inc('no_target')
+                return
+
+            # Process message
+            try:
+                logger.debug("Processing message {} from channel {}", event.message.id, channel_id)
+                await self.message_handler.process_message(event.message)
             except Exception as e:
-                logger.error(f"Error in message handler: {str(e)}")
+                logger.error(f"Error processing message {event.message.id}: {str(e)}")
+        except Exception as e:
+            logger.error(f"Error in message handler: {str(e)}")
+
+    async def _handle_edited_message(self, event):
+        """Mirror edit of post in monitored channel"""
+        if not self._ready or not self.command_handler.is_running:
+            return
+        await self.message_handler.process_edit(event.message)
+
+    async def _handle_deleted_messages(self, event):
+        """Mirror deletion of posts in monitored channel"""
+        if not self._ready or not self.command_handler.is_running or not event.is_channel:
+            return
+        try:
+            self.message_handler.process_deletion(utils.resolve_id(event.chat_id)[0], event.deleted_ids)
+        except Exception as e:
+            logger.error(f"Error mirroring deleted messages: {str(e)}")
 
 async def main():
     try:
@@ -174,4 +353,11 @@ async def main():
         loop.stop()
 
 if __name__ == "__main__":
+    setup_logging(LOG_LEVEL, LOG_FILE, LOG_JSON, LOG_SAMPLE_RATE, LOG_SAMPLE_BURST)
+    if USE_UVLOOP:
+        try:
+            import uvloop
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        except ImportError:
+            logger.warning("USE_UVLOOP is set but uvloop is not installed, using default event loop")
     asyncio.run(main()) 
\ No newline at end of file
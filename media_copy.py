@@ -0,0 +1,193 @@
+import asyncio
+import math
+import random
+import time
+from collections import OrderedDict
+from typing import Hashable, List, Optional, Tuple
+from telethon import utils
+from telethon.errors import FileReferenceExpiredError, FileReferenceInvalidError, FloodError, MediaEmptyError
+from telethon.extensions import html
+from telethon.tl.functions.upload import SaveBigFilePartRequest, SaveFilePartRequest
+from telethon.tl.types import (
+    InputFile, InputFileBig, InputMediaUploadedDocument, InputMediaUploadedPhoto,
+    Message, MessageMediaDocument, MessageMediaPhoto, MessageMediaWebPage
+)
+from loguru import logger
+from metrics import metrics
+from rate_limiter import RateLimiter
+
+# Largest part Telegram accepts, files above BIG_FILE_SIZE must be uploaded as big file
+PART_SIZE = 512 * 1024
+BIG_FILE_SIZE = 10 * 1024 * 1024
+
+MediaKey = Tuple[Hashable, str, int]  # (client, 'photo' or 'document', source media id)
+
+class MediaCopier:
+    """Re-sends posts of channels that do not allow forwarding"""
+
+    def __init__(self, concurrency: int, cache_size: int):
+        self._transfers = asyncio.Semaphore(max(1, concurrency))
+        self._cache_size = cache_size
+        # Media already uploaded by an account, reposts of the same file are sent without uploading
+        self._uploaded: 'OrderedDict[MediaKey, object]' = OrderedDict()
+
+    async def copy(
+        self, rate_limiter: RateLimiter, messages: List[Message], target_channel_id: int
+    ) -> List[Tuple[int, int]]:
+        """Send copies of messages (single post or album) to target, returns (source id, sent id) pairs"""
+        try:
+            return await self._send(rate_limiter, messages, target_channel_id)
+        except (FileReferenceExpiredError, FileReferenceInvalidError, MediaEmptyError) as e:
+            # Cached upload is not usable anymore, upload again
+            logger.debug("Cached media rejected ({}), uploading again", str(e))
+            for message in messages:
+                key = self._key(rate_limiter, message)
+                if key:
+                    self._uploaded.pop(key, None)
+            return await self._send(rate_limiter, messages, target_channel_id)
+
+    async def _send(
+        self, rate_limiter: RateLimiter, messages: List[Message], target_channel_id: int
+    ) -> List[Tuple[int, int]]:
+        media = await asyncio.gather(*(self._input_media(rate_limiter, message) for message in messages))
+        files = [(message, item) for message, item in zip(messages, media) if item is not None]
+
+        if len(files) > 1:
+            # Telethon does not pass formatting entities of album captions, send them as HTML
+            sent = await rate_limiter.call(
+                'send_file',
+                target_channel_id,
+                [item for _, item in files],
+                caption=[html.unparse(message.message or '', message.entities or []) for message, _ in files],
+                parse_mode='html',
+                destination=target_channel_id
+            )
+        elif files:
+            message, item = files[0]
+            sent = [await rate_limiter.call(
+                'send_file',
+                target_channel_id,
+                item,
+                caption=message.message or '',
+                formatting_entities=message.entities,
+                parse_mode=None,
+                destination=target_channel_id
+            )]
+        else:
+            sent = []
+            for message in messages:
+                if not message.message:
+                    continue  # Polls, locations and other media that can not be copied
+                files.append((message, None))
+                sent.append(await rate_limiter.call(
+                    'send_message',
+                    target_channel_id,
+                    message.message,
+                    formatting_entities=message.entities,
+                    parse_mode=None,
+                    link_preview=isinstance(message.media, MessageMediaWebPage),
+                    destination=target_channel_id
+                ))
+
+        delivered = []
+        for (message, _), result in zip(files, sent):
+            if not result:
+                continue
+            key = self._key(rate_limiter, message)
+            if key and result.media:
+                self._remember(key, utils.get_input_media(result.media))
+            delivered.append((message.id, result.id))
+        return delivered
+
+    @staticmethod
+    def _key(rate_limiter: RateLimiter, message: Message) -> Optional[MediaKey]:
+        # Uploaded files belong to the account that uploaded them
+        if isinstance(message.media, MessageMediaPhoto) and message.media.photo:
+            return (rate_limiter.client, 'photo', message.media.photo.id)
+        if isinstance(message.media, MessageMediaDocument) and message.media.document:
+            return (rate_limiter.client, 'document', message.media.document.id)
+        return None
+
+    def _remember(self, key: MediaKey, media) -> None:
+        self._uploaded[key] = media
+        self._uploaded.move_to_end(key)
+        while len(self._uploaded) > self._cache_size:
+            self._uploaded.popitem(last=False)
+
+    async def _input_media(self, rate_limiter: RateLimiter, message: Message):
+        """Get media of message uploaded by this account, None for text and unsupported media"""
+        key = self._key(rate_limiter, message)
+        if key is None:
+            return None
+        cached = self._uploaded.get(key)
+        if cached is not None:
+            self._uploaded.move_to_end(key)
+            metrics.upload_cache.inc('hit')
+            return cached
+        metrics.upload_cache.inc('miss')
+
+        if isinstance(message.media, MessageMediaPhoto):
+            # Photos are always small, their size is only known after download
+            uploaded = await self._transfer(rate_limiter, message.media, 0, 'photo.jpg')
+            return InputMediaUploadedPhoto(
+                uploaded, spoiler=message.media.spoiler, ttl_seconds=message.media.ttl_seconds
+            )
+
+        document = message.media.document
+        uploaded = await self._transfer(rate_limiter, message.media, document.size, 'file')
+        return InputMediaUploadedDocument(
+            uploaded,
+            mime_type=document.mime_type,
+            attributes=document.attributes,
+            spoiler=message.media.spoiler,
+            ttl_seconds=message.media.ttl_seconds
+        )
+
+    async def _transfer(self, rate_limiter: RateLimiter, media, size: int, name: str):
+        """Stream file from source to upload parts, only one part is held in memory"""
+        big = size > BIG_FILE_SIZE
+        total_parts = math.ceil(size / PART_SIZE) if big else -1
+        file_id = random.getrandbits(63)
+        part = 0
+        transferred = 0
+        buffer = bytearray()
+
+        async def save(data: bytes) -> None:
+            if big:
+                request = SaveBigFilePartRequest(file_id, part, total_parts, data)
+            else:
+                request = SaveFilePartRequest(file_id, part, data)
+            if not await rate_limiter.invoke(request):
+                raise RuntimeError(f"Telegram did not save part {part} of file")
+
+        async with self._transfers:
+            started = time.monotonic()
+            attempt = 0
+            while True:
+                try:
+                    # Downloaded chunks are not guaranteed to be part sized, so they are regrouped.
+                    # After a FloodWait the download resumes where it stopped
+                    async for chunk in rate_limiter.client.iter_download(
+                        media, offset=transferred, request_size=PART_SIZE, file_size=size or None
+                    ):
+                        buffer.extend(chunk)
+                        transferred += len(chunk)
+                        while len(buffer) >= PART_SIZE:
+                            await save(bytes(buffer[:PART_SIZE]))
+                            del buffer[:PART_SIZE]
+                            part += 1
+                    break
+                except FloodError as e:
+                    attempt += 1
+                    await rate_limiter.retry_after('GetFileRequest', e, attempt)
+            if buffer or not part:
+                await save(bytes(buffer))
+                part += 1
+            elapsed = time.monotonic() - started
+
+        metrics.copied_bytes.inc(amount=transferred)
+        metrics.copy_transfer.observe(elapsed)
+        logger.debug("Transferred {} bytes in {:.2f}s", transferred, elapsed)
+        if big:
+            return InputFileBig(file_id, part, name)
+        return InputFile(file_id, part, name, md5_checksum='')
@@ -1,130 +1,479 @@
-from typing import List, Dict, Set
-from telethon import TelegramClient, types
-from telethon.tl.types import Message
+import asyncio
+import time
+from collections import OrderedDict
+from typing import List, Dict, Optional, Set, Tuple
+from telethon import utils
+from telethon.errors import ChatForwardsRestrictedError, MessageNotModifiedError, RPCError
+from telethon.tl.types import Message, MessageMediaWebPage, PeerChannel
 from loguru import logger
+from config import (
+    ALBUM_FLUSH_DELAY, ALBUM_MAX_SIZE, DEDUP_CACHE_SIZE, DEDUP_CACHE_TTL,
+    FORWARD_WORKERS, FORWARD_BATCH_WINDOW, FORWARD_BATCH_SIZE,
+    FORWARD_QUEUE_DEPTH, FORWARD_QUEUE_OVERFLOW, FORWARD_MAX_ATTEMPTS, FORWARD_RETRY_DELAY, FORWARD_MAX_AGE,
+    OUTBOX_FILE, OUTBOX_COMMIT_INTERVAL, BACKFILL_CONCURRENCY, BACKFILL_LIMIT,
+    MARK_READ, MARK_READ_INTERVAL, MARK_READ_MAX_PENDING,
+    CONTENT_DEDUP, CONTENT_DEDUP_FILE, CONTENT_DEDUP_WINDOW,
+    CONTENT_DEDUP_MAX_ENTRIES, CONTENT_DEDUP_MIN_TEXT, CONTENT_DEDUP_SAVE_INTERVAL,
+    DIGEST_INTERVAL, DIGEST_MAX_ITEMS, DIGEST_SNIPPET_LENGTH,
+    COPY_MODE, COPY_CONCURRENCY, COPY_CACHE_SIZE,
+    MIRROR_CHANGES, MESSAGE_MAP_FILE, MESSAGE_MAP_WINDOW, MESSAGE_MAP_MAX_ENTRIES, DELETE_BATCH_INTERVAL,
+    MIRROR_EDIT_REPLACE_WINDOW
+)
+from album_assembler import AlbumAssembler
+from content_dedup import FingerprintIndex, fingerprint, for_target
+from dedup_cache import DedupCache
+from deletion_batcher import DeletionBatcher
+from digest import DigestBuffer
+from forward_queue import ForwardQueue
+from media_copy import MediaCopier
+from message_map import MessageMap
+from metrics import metrics
+from outbox import Outbox
+from rate_limiter import RateLimiter
+from read_acknowledger import ReadAcknowledger
+from routing import Router, media_type
+from session_pool import SessionPool
+from storage import Storage
 
 class MessageHandler:
-    def __init__(self, client: TelegramClient):
-        self.client = client
-        self._processed_messages = set()  # Cache of processed message IDs
-        self._processed_albums = set()  # Cache of processed album IDs
+    def __init__(self, rate_limiter: RateLimiter, storage: Storage, router: Router, pool: Optional[SessionPool] = None):
+        self.rate_limiter = rate_limiter
+        self.storage = storage
+        self.router = router
+        self.pool = pool
+        # Bounded caches of processed (channel_id, message_id) / (channel_id, grouped_id)
+        self._processed_messages = DedupCache(DEDUP_CACHE_SIZE, DEDUP_CACHE_TTL)
+        self._processed_albums = DedupCache(DEDUP_CACHE_SIZE, DEDUP_CACHE_TTL)
+        self._album_assembler = AlbumAssembler(self._handle_album, ALBUM_FLUSH_DELAY, ALBUM_MAX_SIZE)
+        outbox = Outbox(OUTBOX_FILE, OUTBOX_COMMIT_INTERVAL)
+        # Last ids are committed with outbox acks, so catch-up after a crash does not resend delivered posts
+        storage.attach_last_ids(outbox)
+        self._forward_queue = ForwardQueue(
+            self._forward_messages,
+            FORWARD_WORKERS,
+            FORWARD_BATCH_WINDOW,
+            FORWARD_BATCH_SIZE,
+            outbox,
+            weight=lambda chat_id: self.storage.get_priority(utils.resolve_id(chat_id)[0]),
+            max_depth=FORWARD_QUEUE_DEPTH,
+            overflow=FORWARD_QUEUE_OVERFLOW,
+            max_attempts=FORWARD_MAX_ATTEMPTS,
+            retry_delay=FORWARD_RETRY_DELAY,
+            max_age=FORWARD_MAX_AGE,
+            on_drop=self._on_dropped,
+            on_resume=self._on_resumed
+        )
+        # Gauges are read on scrape, nothing is computed per message
+        metrics.queue_depth.set_function(self._forward_queue.qsize)
+        metrics.pending_messages.set_function(self._forward_queue.pending_messages)
+        metrics.dedup_cache.set_function(lambda: {
+            (cache, stat): value
+            for cache, stats in self.get_cache_stats().items() for stat, value in stats.items()
+        })
+        # Fingerprints of forwarded content, to skip reposts across channels
+        self._content_index = None
+        if CONTENT_DEDUP:
+            self._content_index = FingerprintIndex(
+                CONTENT_DEDUP_FILE, CONTENT_DEDUP_WINDOW, CONTENT_DEDUP_MAX_ENTRIES, CONTENT_DEDUP_SAVE_INTERVAL
+            )
+            self._content_index.load()
+        # Fingerprints per target of queued (chat_id, message_id, target), added to index once delivered and
+        # released when the post is dropped. Reposts of queued content are skipped too, counted per fingerprint
+        self._pending_fingerprints: 'OrderedDict[Tuple[int, int, int], List[int]]' = OrderedDict()
+        self._pending_counts: Dict[int, int] = {}
+        # Channels that do not allow forwarding, their posts are copied instead
+        self._copier = MediaCopier(COPY_CONCURRENCY, COPY_CACHE_SIZE) if COPY_MODE else None
+        self._protected: Set[int] = set()
+        # Where delivered posts ended up, so source edits and deletions reach the targets
+        self._message_map = None
+        self._deletions = None
+        if MIRROR_CHANGES:
+            self._message_map = MessageMap(MESSAGE_MAP_FILE, MESSAGE_MAP_WINDOW, MESSAGE_MAP_MAX_ENTRIES)
+            self._message_map.open()
+            self._deletions = DeletionBatcher(rate_limiter, DELETE_BATCH_INTERVAL)
+        # (source, message id, target) of edited posts queued again -> stale forward deleted on delivery
+        self._replacing: 'OrderedDict[Tuple[int, int, int], int]' = OrderedDict()
+        self._read_acknowledger = ReadAcknowledger(
+            rate_limiter, MARK_READ_INTERVAL, MARK_READ_MAX_PENDING, MARK_READ,
+            limiter_for=lambda chat_id: self._owner_limiter(utils.resolve_id(chat_id)[0])
+        )
+        self._digest = DigestBuffer(
+            rate_limiter, storage, DIGEST_INTERVAL, DIGEST_MAX_ITEMS, DIGEST_SNIPPET_LENGTH,
+            on_sent=self._on_delivered
+        )
 
-    async def process_message(self, message: Message, target_channel_id: int) -> None:
+    async def process_message(self, message: Message) -> None:
         """Process single message or part of album"""
         try:
-            if message.id in self._processed_messages:
-                logger.debug(f"Skipping already processed message {message.id}")
+            if self._processed_messages.contains(message.chat_id, message.id):
+                logger.debug("Skipping already processed message {}", message.id)
+                metrics.updates_filtered.inc('duplicate_message')
                 return
 
             # Handle grouped messages (albums)
             if message.grouped_id:
-                group_id = str(message.grouped_id)
-                if group_id in self._processed_albums:
-                    logger.debug(f"Skipping already processed album {group_id}")
-                    return
-                    
-             
-                album_messages = await message.client.get_messages(
-                    message.chat_id,
-                    ids=[message.id - i for i in range(10)] 
-                )
-                
-                
-                is_first_in_album = all(
-                    msg is None or msg.grouped_id != message.grouped_id 
-                    for msg in album_messages 
-                    if msg and msg.id < message.id
-                )
-                
-                if not is_first_in_album:
-                    logger.debug(f"Skipping non-first message {message.id} in album {group_id}")
+                if self._processed_albums.contains(message.chat_id, message.grouped_id):
+                    logger.debug("Skipping already processed album {}", message.grouped_id)
+                    metrics.updates_filtered.inc('duplicate_album')
                     return
-                    
-                logger.debug(f"Processing first message {message.id} of album {group_id}")
-                await self._handle_album_message(message, target_channel_id)
+
+                # Parts arrive as separate updates, collect them in memory
+                await self._album_assembler.add(message)
             else:
-                await self._forward_single_message(message, target_channel_id)
+                await self._queue_single_message(message)
         except Exception as e:
             logger.error(f"Error in process_message: {str(e)}")
 
-    async def _handle_album_message(self, message: Message, target_channel_id: int) -> None:
-        """Handle message that is part of an album"""
-        if not message.grouped_id:
+    async def _handle_album(self, album: List[Message]) -> None:
+        """Queue assembled album and mark it as processed"""
+        group_id = album[0].grouped_id
+        logger.info("Prepared album {} with {} messages for forwarding", group_id, len(album))
+
+        # Mark all messages as processed
+        self._processed_albums.add(album[0].chat_id, group_id)
+        for msg in album:
+            self._processed_messages.add(msg.chat_id, msg.id)
+        await self._queue(album)
+
+    async def _queue_single_message(self, message: Message) -> None:
+        """Queue single message for forwarding"""
+        self._processed_messages.add(message.chat_id, message.id)
+        await self._queue([message])
+
+    async def _queue(self, messages: List[Message]) -> None:
+        """Queue message or album for every target it is routed to"""
+        targets = self.router.route(messages[0].peer_id.channel_id, messages)
+        if not targets:
+            logger.debug("No route matched message {} from {}", messages[0].id, messages[0].chat_id)
+            metrics.updates_filtered.inc('no_route', amount=len(messages))
+            self._on_filtered(messages)
             return
-            
-        group_id = str(message.grouped_id)
-        logger.debug(f"Starting to process album {group_id} (message {message.id})")
-        
+        targets = self._new_content_targets(messages, targets)
+        if not targets:
+            logger.info("Skipping message {} from {}, same content was already forwarded", messages[0].id, messages[0].chat_id)
+            metrics.updates_filtered.inc('duplicate_content', amount=len(messages))
+            self._on_filtered(messages)
+            return
+        # In digest mode text posts are summarized, media still goes through forwarding
+        if self.storage.get_digest_mode() and len(messages) == 1 and media_type(messages[0]) == 'text':
+            for target_channel_id in targets:
+                self._digest.add(target_channel_id, messages[0].chat_id, messages[0])
+            return
+
+        if messages[0].noforwards:
+            self._protected.add(messages[0].chat_id)
+        message_ids = [msg.id for msg in messages]
+        for target_channel_id in targets:
+            await self._forward_queue.put(messages[0].chat_id, message_ids, target_channel_id)
+
+    @staticmethod
+    def _bare(target_channel_id: int) -> int:
+        # Targets may be stored as marked ids by older settings
+        return target_channel_id if target_channel_id > 0 else utils.resolve_id(target_channel_id)[0]
+
+    def _new_content_targets(self, messages: List[Message], targets: List[int]) -> List[int]:
+        """Get targets that did not receive text or media of messages from any channel yet"""
+        if self._content_index is None:
+            return targets
+        by_message = [fingerprint(message, CONTENT_DEDUP_MIN_TEXT) for message in messages]
+        fresh = []
+        for target_channel_id in targets:
+            target = self._bare(target_channel_id)
+            keyed = [for_target(fingerprints, target) for fingerprints in by_message]
+            all_fingerprints = [fp for fingerprints in keyed for fp in fingerprints]
+            # Content still queued counts as forwarded, the first copy may wait minutes at peak times
+            if any(fp in self._pending_counts for fp in all_fingerprints) or self._content_index.seen(all_fingerprints):
+                continue
+            fresh.append(target_channel_id)
+            for message, fingerprints in zip(messages, keyed):
+                if fingerprints:
+                    self._pending_fingerprints[(message.chat_id, message.id, target)] = fingerprints
+                    for fp in fingerprints:
+                        self._pending_counts[fp] = self._pending_counts.get(fp, 0) + 1
+        while len(self._pending_fingerprints) > DEDUP_CACHE_SIZE:
+            self._release_fingerprints(*next(iter(self._pending_fingerprints)))
+        return fresh
+
+    def _release_fingerprints(self, chat_id: int, message_id: int, target: int) -> Optional[List[int]]:
+        """Stop holding fingerprints of message queued for bare target id, returns them"""
+        fingerprints = self._pending_fingerprints.pop((chat_id, message_id, target), None)
+        for fp in fingerprints or ():
+            count = self._pending_counts[fp] - 1
+            if count:
+                self._pending_counts[fp] = count
+            else:
+                del self._pending_counts[fp]
+        return fingerprints
+
+    def _owner_limiter(self, channel_id: int) -> RateLimiter:
+        """Get rate limiter of session monitoring channel"""
+        return self.pool.owner(channel_id).rate_limiter if self.pool else self.rate_limiter
+
+    async def _forward_messages(self, source_channel_id: int, message_ids: List[int], target_channel_id: int) -> None:
+        """Forward batch of messages from one source channel with a single request"""
+        if self._copier and source_channel_id in self._protected:
+            await self._copy_messages(source_channel_id, message_ids, target_channel_id)
+            return
+        if self.pool:
+            limiters = self.pool.deliverers(utils.resolve_id(source_channel_id)[0], target_channel_id)
+        else:
+            limiters = [self.rate_limiter]
         try:
-            # Get messages by grouped_id
-            album_messages = []
-            async for msg in message.client.iter_messages(
-                message.chat_id,
-                limit=50,  
-                wait_time=0  
-            ):
-                if msg.grouped_id != message.grouped_id:
-                    continue
-                if isinstance(msg.media, (types.MessageMediaPhoto, types.MessageMediaDocument)):
-                    album_messages.append(msg)
-                    logger.debug(f"Found album message {msg.id}")
-                
-                
-                if len(album_messages) >= 10 or msg.id < message.id - 20:
+            for n, limiter in enumerate(limiters):
+                try:
+                    sent = await limiter.call(
+                        'forward_messages',
+                        target_channel_id,
+                        messages=message_ids,
+                        from_peer=source_channel_id,
+                        destination=target_channel_id
+                    )
                     break
-            
-            if not album_messages:
-                logger.warning(f"No media messages found in album {group_id}")
-                return
-                
-            # Sort messages by ID to maintain order
-            album = sorted(album_messages, key=lambda x: x.id)
-            logger.info(f"Prepared album {group_id} with {len(album)} messages for forwarding")
-            
-            # Forward the album
-            await self._forward_album(album, target_channel_id)
-            
-            # Mark all messages as processed
-            self._processed_albums.add(group_id)
-            for msg in album:
-                self._processed_messages.add(msg.id)
-                logger.debug(f"Marked message {msg.id} as processed")
-            
-            logger.info(f"Completed processing album {group_id}")
-                
-        except Exception as e:
-            logger.error(f"Error handling album {group_id}: {str(e)}")
+                except ChatForwardsRestrictedError:
+                    raise  # Setting of the source channel, no session can forward
+                except (ValueError, RPCError) as e:
+                    # Session has never seen source or target channel, is not a member or may not post
+                    # there. The owner is the last resort, only its error fails the batch
+                    if n == len(limiters) - 1:
+                        raise
+                    logger.debug("Session can not forward from {}: {}", source_channel_id, str(e))
+        except ChatForwardsRestrictedError:
+            if not self._copier:
+                raise
+            logger.info(f"Channel {source_channel_id} does not allow forwarding, copying its posts")
+            self._protected.add(source_channel_id)
+            await self._copy_messages(source_channel_id, message_ids, target_channel_id)
+            return
+        logger.info("Forwarded {} messages from channel {} to target channel", len(message_ids), source_channel_id)
+        # Results are in order of requested ids, None for messages that were not forwarded
+        self._record(source_channel_id, [
+            (message_id, message.id) for message_id, message in zip(message_ids, sent) if message
+        ], target_channel_id)
+        self._on_delivered(source_channel_id, message_ids, target_channel_id, sent)
 
-    async def _forward_single_message(self, message: Message, target_channel_id: int) -> None:
-        """Forward single message to target channel"""
-        try:
-            await self.client.forward_messages(target_channel_id, message)
-            await message.mark_read()
-            self._processed_messages.add(message.id)
-            logger.info(f"Forwarded message {message.id} to target channel")
-        except Exception as e:
-            logger.error(f"Error forwarding message {message.id}: {str(e)}")
+    async def _copy_messages(self, source_channel_id: int, message_ids: List[int], target_channel_id: int) -> None:
+        """Re-send messages of channel that does not allow forwarding, albums stay grouped"""
+        limiter = self._owner_limiter(utils.resolve_id(source_channel_id)[0])
+        # Fetched again, so file references are fresh even for forwards resumed from outbox
+        messages = await limiter.call('get_messages', source_channel_id, ids=message_ids)
+        posts: List[List[Message]] = []
+        for message in messages:
+            if message is None:
+                continue  # Deleted meanwhile
+            if message.grouped_id and posts and posts[-1][0].grouped_id == message.grouped_id:
+                posts[-1].append(message)
+            else:
+                posts.append([message])
 
-    async def _forward_album(self, album: List[Message], target_channel_id: int) -> None:
-        """Forward album to target channel"""
-        try:
-            # Forward messages as a group
-            await self.client.forward_messages(
-                target_channel_id,
-                messages=album,
-                from_peer=album[0].chat_id
-            )
-            
-            # Mark as read after successful forward
-            for message in album:
-                await message.mark_read()
-            
-            logger.info(f"Successfully forwarded album with {len(album)} messages to target channel")
-        except Exception as e:
-            logger.error(f"Error forwarding album: {str(e)}")
-            logger.error(f"Album details: {len(album)} messages, first message ID: {album[0].id if album else 'unknown'}")
+        delivered: List[Tuple[int, int]] = []
+        for post in posts:
+            delivered.extend(await self._copier.copy(limiter, post, target_channel_id))
+        metrics.copied_messages.inc(amount=len(delivered))
+        logger.info("Copied {} messages from channel {} to target channel", len(delivered), source_channel_id)
+        self._record(source_channel_id, delivered, target_channel_id, copied=True)
+        self._on_delivered(source_channel_id, message_ids, target_channel_id, messages)
+
+    def _record(
+        self, source_channel_id: int, delivered: List[Tuple[int, int]], target_channel_id: int, copied: bool = False
+    ) -> None:
+        """Remember target message ids of delivered (source id, target id) pairs"""
+        if self._message_map is None:
+            return
+        target = self._bare(target_channel_id)
+        source = utils.resolve_id(source_channel_id)[0]
+        for message_id, target_message_id in delivered:
+            self._message_map.add(source, message_id, target, target_message_id, copied)
+            stale = self._replacing.pop((source, message_id, target), None)
+            if stale is not None and stale != target_message_id:
+                self._deletions.delete(utils.get_peer_id(PeerChannel(target)), [stale])
+                metrics.mirrored_changes.inc('replace')
+
+    async def process_edit(self, message: Message) -> None:
+        """Mirror edit of delivered source message to its targets"""
+        # edit_hide is set when only reactions or buttons changed
+        if self._message_map is None or message.edit_hide:
+            return
+        targets = self._message_map.get(message.peer_id.channel_id, message.id)
+        if not targets:
+            return
+        limiter = self._owner_limiter(message.peer_id.channel_id)
+        routed = None
+        for target, (target_message_id, copied) in targets.items():
+            target_channel_id = utils.get_peer_id(PeerChannel(target))
+            try:
+                if copied:
+                    await limiter.call(
+                        'edit_message',
+                        target_channel_id,
+                        target_message_id,
+                        message.message or '',
+                        formatting_entities=message.entities,
+                        parse_mode=None,
+                        link_preview=isinstance(message.media, MessageMediaWebPage),
+                        destination=target_channel_id
+                    )
+                    metrics.mirrored_changes.inc('edit')
+                elif message.grouped_id:
+                    # Re-forwarding one part would split the album
+                    logger.debug("Not mirroring edit of album part {} from {}", message.id, message.chat_id)
+                elif time.time() - message.date.timestamp() > MIRROR_EDIT_REPLACE_WINDOW:
+                    logger.debug("Not mirroring edit of forwarded message {} from {}", message.id, message.chat_id)
+                else:
+                    # Forwarded posts can not be edited, the edited post replaces the stale forward.
+                    # It is queued like any post, the stale one is deleted once it is delivered
+                    if routed is None:
+                        routed = {
+                            self._bare(routed_target)
+                            for routed_target in self.router.route(message.peer_id.channel_id, [message])
+                        }
+                    if target not in routed:
+                        logger.debug("Edited message {} from {} no longer matches its route", message.id, message.chat_id)
+                        continue
+                    self._replacing[(message.peer_id.channel_id, message.id, target)] = target_message_id
+                    while len(self._replacing) > DEDUP_CACHE_SIZE:
+                        self._replacing.popitem(last=False)
+                    await self._forward_queue.put(message.chat_id, [message.id], target_channel_id)
+            except MessageNotModifiedError:
+                pass
+            except Exception as e:
+                logger.warning(f"Could not mirror edit of message {message.id} from {message.chat_id}: {str(e)}")
+
+    def process_deletion(self, channel_id: int, message_ids: List[int]) -> None:
+        """Delete copies of deleted source messages, coalesced per target"""
+        if self._message_map is None:
+            return
+        targets: Dict[int, List[int]] = {}
+        for message_id in message_ids:
+            for target, (target_message_id, _) in self._message_map.get(channel_id, message_id).items():
+                targets.setdefault(target, []).append(target_message_id)
+        for target, target_message_ids in targets.items():
+            self._deletions.delete(utils.get_peer_id(PeerChannel(target)), target_message_ids)
+
+    def _on_filtered(self, messages: List[Message]) -> None:
+        """Remember skipped posts as handled, so catch-up does not fetch them again"""
+        # Earlier posts still queued are in the outbox, so moving past them does not lose them
+        self.storage.update_last_id(utils.resolve_id(messages[0].chat_id)[0], max(msg.id for msg in messages))
+
+    def _on_resumed(self, source_channel_id: int, message_ids: List[int]) -> None:
+        """Mark posts resumed from outbox as processed, so catch-up does not queue them again"""
+        for message_id in message_ids:
+            self._processed_messages.add(source_channel_id, message_id)
+
+    def _on_dropped(self, source_channel_id: int, message_ids: List[int], target_channel_id: int) -> None:
+        """Release content of posts that were dropped or failed, so a repost can still go through"""
+        target = self._bare(target_channel_id)
+        for message_id in message_ids:
+            self._release_fingerprints(source_channel_id, message_id, target)
+
+    def _on_delivered(
+        self, source_channel_id: int, message_ids: List[int], target_channel_id: int,
+        messages: Optional[List[Optional[Message]]] = None
+    ) -> None:
+        """Remember last delivered message of source channel, its content and mark it as read"""
+        if self._content_index is not None:
+            target = self._bare(target_channel_id)
+            for n, message_id in enumerate(message_ids):
+                fingerprints = self._release_fingerprints(source_channel_id, message_id, target)
+                if fingerprints is None and messages and n < len(messages) and messages[n]:
+                    # Forwards resumed from outbox were queued before the restart, their content is
+                    # taken from the delivered messages, which are in order of requested ids
+                    fingerprints = for_target(fingerprint(messages[n], CONTENT_DEDUP_MIN_TEXT), target)
+                if fingerprints:
+                    self._content_index.add(fingerprints)
+        self.storage.update_last_id(utils.resolve_id(source_channel_id)[0], message_ids[-1])
+
+        # Reading the newest message marks the whole batch as read
+        self._read_acknowledger.mark(source_channel_id, message_ids[-1], len(message_ids))
+
+    async def catch_up(self, last_ids: Dict[int, int]) -> None:
+        """Queue messages posted after last forwarded id of each channel"""
+        semaphore = asyncio.Semaphore(BACKFILL_CONCURRENCY)
+        started = time.monotonic()
+
+        async def catch_up_channel(channel_id: int, last_id: int) -> int:
+            async with semaphore:
+                try:
+                    messages = await self._owner_limiter(channel_id).call(
+                        'get_messages',
+                        PeerChannel(channel_id),
+                        min_id=last_id,
+                        limit=BACKFILL_LIMIT,
+                        reverse=True
+                    )
+                except Exception as e:
+                    logger.error(f"Error fetching missed messages of channel {channel_id}: {str(e)}")
+                    return 0
+            await self._process_history(messages)
+            return len(messages)
+
+        counts = await asyncio.gather(*(
+            catch_up_channel(channel_id, last_id) for channel_id, last_id in last_ids.items()
+        ))
+        logger.info(
+            f"Caught up {sum(counts)} missed messages from {len(last_ids)} channels "
+            f"in {time.monotonic() - started:.1f}s"
+        )
+
+    async def _process_history(self, messages: List[Message]) -> None:
+        """Queue fetched posts oldest first, albums are complete in history and skip the assembler"""
+        posts: List[List[Message]] = []
+        for message in messages:
+            # Service messages (pins, title changes) are not posts, live updates never include them
+            if not isinstance(message, Message) or self._processed_messages.contains(message.chat_id, message.id):
+                continue
+            if message.grouped_id and posts and posts[-1][0].grouped_id == message.grouped_id:
+                posts[-1].append(message)
+            else:
+                posts.append([message])
+
+        # Queued in id order, so posts keep their order in target channel
+        for post in posts:
+            try:
+                if not post[0].grouped_id:
+                    await self._queue_single_message(post[0])
+                elif not self._processed_albums.contains(post[0].chat_id, post[0].grouped_id):
+                    await self._handle_album(post)
+            except Exception as e:
+                logger.error(f"Error processing missed message {post[0].id}: {str(e)}")
+
+    def start(self) -> None:
+        """Start forwarding workers"""
+        self._forward_queue.start()
+        self._read_acknowledger.start()
+        self._digest.start()
+        if self._deletions:
+            self._deletions.start()
+        if self._content_index is not None:
+            self._content_index.start()
+
+    async def stop(self) -> None:
+        """Stop forwarding workers, queued forwards are kept in outbox"""
+        # Buffered albums are queued first, so they reach the outbox too
+        await self._album_assembler.flush_all()
+        await self._forward_queue.stop()
+        await self._digest.stop()
+        await self._read_acknowledger.stop()
+        if self._deletions:
+            await self._deletions.stop()
+        if self._message_map is not None:
+            self._message_map.close()
+        if self._content_index is not None:
+            await self._content_index.stop()
 
     def clear_cache(self) -> None:
         """Clear the cache of processed messages"""
         self._processed_messages.clear()
-        self._processed_albums.clear() 
\ No newline at end of file
+        self._processed_albums.clear()
+        self._album_assembler.clear()
+
+    def get_cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """Get hit/eviction counters of dedup caches"""
+        return {
+            'messages': self._processed_messages.stats(),
+            'albums': self._processed_albums.stats(),
+            'content': {
+                'size': len(self._content_index) if self._content_index is not None else 0,
+                'hits': self._content_index.hits if self._content_index is not None else 0,
+                'misses': self._content_index.misses if self._content_index is not None else 0,
+            },
+        } 
\ No newline at end of file
@@ -0,0 +1,160 @@
+import mmap
+import os
+import struct
+import time
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+
+_HEADER = struct.Struct('<4sIII')  # (magic, generations, slots per generation, current generation)
+_GENERATION = struct.Struct('<dQ')  # (generation start time, entry count)
+_MAGIC = b'AGMM'
+_SLOT_SIZE = 16  # key and value, both 64-bit
+_ZEROS = bytes(1024 * 1024)
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+_UINT64 = (1 << 64) - 1
+_ID_LIMIT = 1 << 32
+_MESSAGE_ID_LIMIT = 1 << 31
+_COPIED = 1 << 31
+
+class MessageMap:
+    """Memory-mapped (source channel, message id) -> target message ids in rotating generations"""
+
+    def __init__(self, path: str, window: float, max_entries: int, generations: int = 4):
+        self._path = path
+        self._generations_count = generations
+        self._generation_span = window / generations
+        self._capacity = max(1, max_entries // generations)
+        # Tables are filled to at most 3/4, so probe sequences stay short
+        self._bits = max(4, (self._capacity * 4 // 3).bit_length())
+        self._slots = 1 << self._bits
+        self._mmap: Optional[mmap.mmap] = None
+        # Every generation is a fixed size open addressing hash table in the mapped file, so lookups
+        # touch a few pages and the OS writes changes back. A slot packs bare channel id and message id
+        # of the key and the value into two 64-bit numbers
+        self._tables: List[memoryview] = []
+        self._current = 0
+
+    def _size(self) -> int:
+        return (
+            _HEADER.size + _GENERATION.size * self._generations_count
+            + self._slots * _SLOT_SIZE * self._generations_count
+        )
+
+    def open(self) -> None:
+        """Map file into memory, a file of other size or format is started anew"""
+        if self._mmap:
+            return
+        size = self._size()
+        fresh = True
+        if os.path.exists(self._path) and os.path.getsize(self._path) == size:
+            with open(self._path, 'rb') as f:
+                magic, generations, slots, current = _HEADER.unpack(f.read(_HEADER.size))
+            if magic == _MAGIC and generations == self._generations_count and slots == self._slots:
+                fresh = False
+                self._current = current % generations
+        if fresh:
+            if os.path.exists(self._path):
+                logger.info(f"Message map size changed, starting new {self._path}")
+            # Truncate creates a sparse zero filled file, pages are only written once used
+            with open(self._path, 'wb') as f:
+                f.truncate(size)
+
+        with open(self._path, 'r+b') as f:
+            self._mmap = mmap.mmap(f.fileno(), size)
+        offset = _HEADER.size + _GENERATION.size * self._generations_count
+        table_size = self._slots * _SLOT_SIZE
+        for n in range(self._generations_count):
+            start = offset + n * table_size
+            self._tables.append(memoryview(self._mmap)[start:start + table_size].cast('Q'))
+        if fresh:
+            self._write_header()
+            self._set_generation(0, time.time(), 0)
+        logger.debug(f"Opened message map with {len(self)} entries")
+
+    def _write_header(self) -> None:
+        _HEADER.pack_into(self._mmap, 0, _MAGIC, self._generations_count, self._slots, self._current)
+
+    def _generation(self, n: int) -> Tuple[float, int]:
+        return _GENERATION.unpack_from(self._mmap, _HEADER.size + n * _GENERATION.size)
+
+    def _set_generation(self, n: int, started: float, count: int) -> None:
+        _GENERATION.pack_into(self._mmap, _HEADER.size + n * _GENERATION.size, started, count)
+
+    def _rotate(self) -> None:
+        """Start next generation when current one is old or full, overwriting the oldest"""
+        started, count = self._generation(self._current)
+        now = time.time()
+        if now - started < self._generation_span and count < self._capacity:
+            return
+        self._current = (self._current + 1) % self._generations_count
+        raw = self._tables[self._current].cast('B')
+        for start in range(0, len(raw), len(_ZEROS)):
+            end = min(start + len(_ZEROS), len(raw))
+            raw[start:end] = _ZEROS[:end - start]
+        raw.release()
+        self._set_generation(self._current, now, 0)
+        self._write_header()
+
+    def _slot(self, key: int) -> int:
+        return ((key * _HASH_MULTIPLIER) & _UINT64) >> (64 - self._bits)
+
+    def add(self, source_channel_id: int, message_id: int, target_channel_id: int, target_message_id: int,
+            copied: bool = False) -> None:
+        """Remember where message of source channel was delivered, ids are bare channel ids"""
+        if not self._mmap:
+            return
+        if max(source_channel_id, target_channel_id) >= _ID_LIMIT or max(message_id, target_message_id) >= _MESSAGE_ID_LIMIT:
+            return
+        self._rotate()
+        key = source_channel_id << 32 | message_id
+        value = target_channel_id << 32 | (_COPIED if copied else 0) | target_message_id
+        table = self._tables[self._current]
+        mask = self._slots - 1
+        slot = self._slot(key)
+        while table[slot * 2]:
+            if table[slot * 2] == key and table[slot * 2 + 1] == value:
+                return
+            slot = (slot + 1) & mask
+        table[slot * 2 + 1] = value
+        table[slot * 2] = key
+        started, count = self._generation(self._current)
+        self._set_generation(self._current, started, count + 1)
+
+    def get(self, source_channel_id: int, message_id: int) -> Dict[int, Tuple[int, bool]]:
+        """Get target channel -> (target message id, copied) of message, latest delivery wins"""
+        if not self._mmap or source_channel_id >= _ID_LIMIT or message_id >= _MESSAGE_ID_LIMIT:
+            return {}
+        key = source_channel_id << 32 | message_id
+        deadline = time.time() - self._generation_span * self._generations_count
+        mask = self._slots - 1
+        targets: Dict[int, Tuple[int, bool]] = {}
+        # Oldest generation first, so later deliveries to the same target replace earlier ones
+        for n in range(1, self._generations_count + 1):
+            generation = (self._current + n) % self._generations_count
+            started, count = self._generation(generation)
+            if not count or started < deadline:
+                continue
+            table = self._tables[generation]
+            slot = self._slot(key)
+            while table[slot * 2]:
+                if table[slot * 2] == key:
+                    value = table[slot * 2 + 1]
+                    targets[value >> 32] = (value & (_COPIED - 1), bool(value & _COPIED))
+                slot = (slot + 1) & mask
+        return targets
+
+    def close(self) -> None:
+        """Flush changes to disk and unmap file"""
+        if not self._mmap:
+            return
+        for table in self._tables:
+            table.release()
+        self._tables.clear()
+        self._mmap.flush()
+        self._mmap.close()
+        self._mmap = None
+
+    def __len__(self) -> int:
+        if not self._mmap:
+            return 0
+        return sum(self._generation(n)[1] for n in range(self._generations_count))
@@ -0,0 +1,212 @@
+import asyncio
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from loguru import logger
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TRANSFER_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, values)) + '}'
+
+class Counter:
+    """Monotonic counter, optionally split by label values"""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def get(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def total(self) -> float:
+        return sum(self._values.values())
+
+    def items(self) -> List[Tuple[Tuple[str, ...], float]]:
+        return sorted(self._values.items())
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, value in self.items():
+            lines.append(f"{self.name}{_labels(self.labels, values)} {value:g}")
+        return lines
+
+class Gauge:
+    """Value read from a callback when metrics are collected, labeled gauges read a dict of label values"""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._func: Optional[Callable[[], Any]] = None
+
+    def set_function(self, func: Callable[[], Any]) -> None:
+        self._func = func
+
+    def _read(self) -> Any:
+        empty = {} if self.labels else 0
+        if not self._func:
+            return empty
+        try:
+            return self._func()
+        except Exception as e:
+            logger.debug(f"Error reading gauge {self.name}: {str(e)}")
+            return empty
+
+    def get(self, *label_values: str) -> float:
+        value = self._read()
+        return value.get(label_values, 0) if self.labels else value
+
+    def items(self) -> List[Tuple[Tuple[str, ...], float]]:
+        return sorted(self._read().items()) if self.labels else [((), self._read())]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for values, value in self.items():
+            lines.append(f"{self.name}{_labels(self.labels, values)} {value:g}")
+        return lines
+
+class Histogram:
+    """Histogram with fixed buckets, optionally split by label values"""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [count per bucket..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        data = self._values.get(label_values)
+        if data is None:
+            data = self._values[label_values] = [0] * (len(self.buckets) + 2)
+        data[bisect_left(self.buckets, value)] += 1
+        data[-1] += value
+
+    def count(self, *label_values: str) -> int:
+        data = self._values.get(label_values)
+        return int(sum(data[:-1])) if data else 0
+
+    def average(self, *label_values: str) -> float:
+        data = self._values.get(label_values)
+        count = sum(data[:-1]) if data else 0
+        return data[-1] / count if count else 0.0
+
+    def label_values(self) -> List[Tuple[str, ...]]:
+        return sorted(self._values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values in self.label_values():
+            data = self._values[values]
+            names = self.labels + ('le',)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), data[:-1]):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_labels(names, values + (le,))} {cumulative:g}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, values)} {data[-1]:g}")
+            lines.append(f"{self.name}_count{_labels(self.labels, values)} {cumulative:g}")
+        return lines
+
+class Metrics:
+    """Counters and histograms of the forwarding pipeline"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.updates_received = Counter('aggregator_updates_received_total', "Channel updates received")
+        self.updates_filtered = Counter(
+            'aggregator_updates_filtered_total', "Updates dropped before forwarding", ('reason',)
+        )
+        self.forwards = Counter('aggregator_forwards_total', "Forward requests by result", ('result',))
+        self.forwarded_messages = Counter(
+            'aggregator_forwarded_messages_total', "Messages forwarded by result", ('result',)
+        )
+        self.album_assembly = Histogram('aggregator_album_assembly_seconds', "Time from first album part to flush")
+        self.flood_wait = Counter('aggregator_flood_wait_seconds_total', "FloodWait seconds by method", ('method',))
+        self.api_latency = Histogram('aggregator_api_call_seconds', "Telegram API call latency", ('method',))
+        self.api_errors = Counter('aggregator_api_errors_total', "Failed Telegram API calls", ('method',))
+        self.commands = Counter('aggregator_commands_total', "Saved Messages commands handled", ('command',))
+        self.command_latency = Histogram('aggregator_command_seconds', "Command handling time", ('command',))
+        self.queue_depth = Gauge('aggregator_forward_queue_batches', "Forward batches waiting for a worker")
+        self.pending_messages = Gauge('aggregator_pending_messages', "Messages waiting in coalescing window")
+        self.copied_messages = Counter(
+            'aggregator_copied_messages_total', "Messages re-sent from channels that do not allow forwarding"
+        )
+        self.copied_bytes = Counter('aggregator_copied_bytes_total', "Media bytes streamed from source to upload")
+        self.copy_transfer = Histogram(
+            'aggregator_copy_transfer_seconds', "Time to stream one media file", buckets=TRANSFER_BUCKETS
+        )
+        self.upload_cache = Counter('aggregator_upload_cache_total', "Uploaded media lookups by result", ('result',))
+        self.mirrored_changes = Counter(
+            'aggregator_mirrored_changes_total', "Source edits and deletions applied to targets", ('change',)
+        )
+        self.dedup_cache = Gauge(
+            'aggregator_dedup_cache', "Size, hits, misses and evictions of dedup caches", ('cache', 'stat')
+        )
+        self.log_lines_dropped = Counter('aggregator_log_lines_dropped_total', "Log lines dropped by sampling")
+
+    def _all(self) -> list:
+        return [value for value in vars(self).values() if isinstance(value, (Counter, Gauge, Histogram))]
+
+    def render(self) -> str:
+        """Get all metrics in Prometheus text format"""
+        lines = []
+        for metric in self._all():
+            lines.extend(metric.render())
+        lines.append("# HELP aggregator_uptime_seconds Seconds since start")
+        lines.append("# TYPE aggregator_uptime_seconds gauge")
+        lines.append(f"aggregator_uptime_seconds {time.time() - self.started:.0f}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+class MetricsServer:
+    """Minimal HTTP server exposing metrics for Prometheus scrapes"""
+
+    def __init__(self, host: str, port: int):
+        self._host = host
+        self._port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self._host, self._port)
+        logger.info(f"Metrics available at http://{self._host}:{self._port}/metrics")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Skip request headers
+            while (await asyncio.wait_for(reader.readline(), timeout=5)).strip():
+                pass
+            parts = request.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                status, body = '200 OK', metrics.render().encode()
+            else:
+                status, body = '404 Not Found', b'Not found\n'
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError) as e:
+            logger.debug(f"Metrics request failed: {str(e)}")
+        finally:
+            writer.close()
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
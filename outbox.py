@@ -0,0 +1,128 @@
+import asyncio
+import sqlite3
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from loguru import logger
+
+# (entry_id, source_channel_id, message_ids, target_channel_id, created)
+OutboxEntry = Tuple[int, int, List[int], int, float]
+
+class Outbox:
+    """SQLite backed journal of pending forwards with group commits"""
+
+    def __init__(self, path: str, commit_interval: float):
+        self._path = path
+        self._commit_interval = commit_interval
+        self._db: Optional[sqlite3.Connection] = None
+        self._next_id = 1
+        self._inserts: Dict[int, Tuple[int, int, str, int, float]] = {}
+        self._deletes: List[int] = []
+        # Last delivered message id per channel, committed in the same transaction as acks
+        self._last_ids: Dict[int, int] = {}
+        self._forgotten: Set[int] = set()
+        self._committer: Optional[asyncio.Task] = None
+
+    def open(self) -> None:
+        """Open database and create schema"""
+        if self._db:
+            return
+        self._db = sqlite3.connect(self._path)
+        # WAL with synchronous=NORMAL only syncs on checkpoints, not on every commit
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id INTEGER PRIMARY KEY, source INTEGER NOT NULL, message_ids TEXT NOT NULL, "
+            "target INTEGER NOT NULL, created REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS last_ids (channel INTEGER PRIMARY KEY, message_id INTEGER NOT NULL)"
+        )
+        self._db.commit()
+        row = self._db.execute("SELECT MAX(id) FROM outbox").fetchone()
+        self._next_id = (row[0] or 0) + 1
+
+    def start(self) -> None:
+        """Start periodic group commits"""
+        self.open()
+        if not self._committer:
+            self._committer = asyncio.create_task(self._commit_loop())
+
+    def add(self, source_channel_id: int, message_ids: List[int], target_channel_id: int) -> int:
+        """Record pending forward, returns its entry id"""
+        self.open()
+        entry_id = self._next_id
+        self._next_id += 1
+        ids = ",".join(str(message_id) for message_id in message_ids)
+        self._inserts[entry_id] = (entry_id, source_channel_id, ids, target_channel_id, time.time())
+        return entry_id
+
+    def ack(self, entry_ids: List[int]) -> None:
+        """Remove forwarded entries"""
+        for entry_id in entry_ids:
+            # Entries forwarded before their first commit never hit the disk
+            if self._inserts.pop(entry_id, None) is None:
+                self._deletes.append(entry_id)
+
+    def set_last_id(self, channel_id: int, message_id: int) -> None:
+        """Record last handled message id of channel"""
+        self._last_ids[channel_id] = message_id
+        self._forgotten.discard(channel_id)
+
+    def forget_last_id(self, channel_id: int) -> None:
+        """Remove last message id of channel"""
+        self._last_ids.pop(channel_id, None)
+        self._forgotten.add(channel_id)
+
+    def last_ids(self) -> Dict[int, int]:
+        """Get committed last message ids of channels"""
+        self.open()
+        return dict(self._db.execute("SELECT channel, message_id FROM last_ids").fetchall())
+
+    def pending(self) -> List[OutboxEntry]:
+        """Get committed entries that were not forwarded yet"""
+        self.open()
+        rows = self._db.execute(
+            "SELECT id, source, message_ids, target, created FROM outbox ORDER BY id"
+        ).fetchall()
+        return [
+            (entry_id, source, [int(message_id) for message_id in ids.split(",")], target, created)
+            for entry_id, source, ids, target, created in rows
+        ]
+
+    def commit(self) -> None:
+        """Write buffered changes in a single transaction"""
+        if not self._db or not (self._inserts or self._deletes or self._last_ids or self._forgotten):
+            return
+        inserts = list(self._inserts.values())
+        deletes = [(entry_id,) for entry_id in self._deletes]
+        last_ids = list(self._last_ids.items())
+        forgotten = [(channel_id,) for channel_id in self._forgotten]
+        self._inserts.clear()
+        self._deletes.clear()
+        self._last_ids.clear()
+        self._forgotten.clear()
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO outbox VALUES (?, ?, ?, ?, ?)", inserts)
+            self._db.executemany("DELETE FROM outbox WHERE id = ?", deletes)
+            self._db.executemany("INSERT OR REPLACE INTO last_ids VALUES (?, ?)", last_ids)
+            self._db.executemany("DELETE FROM last_ids WHERE channel = ?", forgotten)
+
+    async def _commit_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._commit_interval)
+            try:
+                self.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error committing outbox: {str(e)}")
+
+    async def close(self) -> None:
+        """Stop group commits, flush buffered changes and close database"""
+        if self._committer:
+            self._committer.cancel()
+            await asyncio.gather(self._committer, return_exceptions=True)
+            self._committer = None
+        if self._db:
+            self.commit()
+            self._db.close()
+            self._db = None
@@ -0,0 +1,47 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set
+
+SendCallback = Callable[[Any], Awaitable[None]]
+
+class PeriodicFlusher:
+    """Sends buffered items per key once per interval, or early when a key is full"""
+
+    def __init__(self, interval: float, pending: Dict[Hashable, Any], send: SendCallback):
+        self._interval = interval
+        self._pending = pending  # Keys of this dict are sent by flush()
+        self._send_key = send
+        self._flusher: Optional[asyncio.Task] = None
+        # Keys sent early because they are full, referenced until done
+        self._tasks: Set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        """Start periodic flushing"""
+        if not self._flusher:
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    def send_early(self, key: Hashable) -> None:
+        """Send key now instead of waiting for the next interval"""
+        task = asyncio.create_task(self._send_key(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self) -> int:
+        """Send all pending keys, returns their number"""
+        keys = list(self._pending)
+        if keys:
+            await asyncio.gather(*(self._send_key(key) for key in keys))
+        return len(keys)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            await self.flush()
+
+    async def stop(self) -> None:
+        """Stop periodic flushing, pending keys are sent first"""
+        if self._flusher:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.flush()
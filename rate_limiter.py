@@ -0,0 +1,141 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from telethon import TelegramClient
+from telethon.errors import FloodError
+from telethon.tl.tlobject import TLRequest
+from loguru import logger
+from metrics import metrics
+
+class TokenBucket:
+    """Token bucket that can additionally be paused for a FloodWait"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self) -> float:
+        """Get seconds until a token can be taken"""
+        self._refill()
+        blocked = max(0.0, self._blocked_until - time.monotonic())
+        if self._tokens >= 1:
+            return blocked
+        return max(blocked, (1 - self._tokens) / self.rate)
+
+    def consume(self) -> None:
+        """Take one token"""
+        self._refill()
+        self._tokens -= 1
+
+    def block(self, seconds: float) -> None:
+        """Pause bucket for given number of seconds"""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+class RateLimiter:
+    """Central rate limiting layer for outgoing Telegram calls"""
+
+    def __init__(
+        self,
+        client: TelegramClient,
+        method_limits: Dict[str, Tuple[float, int]],
+        default_limit: Tuple[float, int],
+        destination_limit: Tuple[float, int],
+        max_retries: int = 5,
+        on_flood: Optional[Callable[[str, float], None]] = None
+    ):
+        self.client = client
+        self._method_limits = method_limits
+        self._default_limit = default_limit
+        self._destination_limit = destination_limit
+        self._max_retries = max_retries
+        self._buckets: Dict[str, TokenBucket] = {}
+        self.on_flood = on_flood
+
+    def _bucket(self, name: str, limit: Tuple[float, int]) -> TokenBucket:
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            bucket = self._buckets[name] = TokenBucket(*limit)
+        return bucket
+
+    def _buckets_for(self, method: str, destination: Optional[int]) -> List[TokenBucket]:
+        buckets = [self._bucket(method, self._method_limits.get(method, self._default_limit))]
+        if destination is not None:
+            buckets.append(self._bucket(f"{method}:{destination}", self._destination_limit))
+        return buckets
+
+    async def _acquire(self, buckets: List[TokenBucket]) -> None:
+        """Wait until every bucket has a token, then take them"""
+        while True:
+            delay = max(bucket.delay() for bucket in buckets)
+            if delay <= 0:
+                for bucket in buckets:
+                    bucket.consume()
+                return
+            await asyncio.sleep(delay)
+
+    async def call(self, method: str, *args, destination: Optional[int] = None, **kwargs) -> Any:
+        """Call client method through its buckets, retrying after FloodWait"""
+        return await self._call(method, getattr(self.client, method), args, kwargs, destination)
+
+    async def invoke(self, request: TLRequest, destination: Optional[int] = None) -> Any:
+        """Invoke raw request through its buckets, retrying after FloodWait"""
+        return await self._call(type(request).__name__, self.client, (request,), {}, destination)
+
+    async def _call(self, method: str, func, args, kwargs, destination: Optional[int]) -> Any:
+        buckets = self._buckets_for(method, destination)
+        attempt = 0
+        while True:
+            await self._acquire(buckets)
+            started = time.monotonic()
+            try:
+                return await func(*args, **kwargs)
+            except FloodError as e:
+                attempt += 1
+                # Pause only the most specific bucket involved in the call
+                self._handle_flood(method, e, attempt, buckets[-1])
+            except Exception:
+                metrics.api_errors.inc(method)
+                raise
+            finally:
+                metrics.api_latency.observe(time.monotonic() - started, method)
+
+    def _handle_flood(self, method: str, error: FloodError, attempt: int, bucket: TokenBucket) -> None:
+        """Pause bucket for FloodWait of method, raising error when it is not retried"""
+        seconds = getattr(error, 'seconds', None)
+        if seconds:
+            metrics.flood_wait.inc(method, amount=seconds)
+            if self.on_flood:
+                self.on_flood(method, seconds)
+        if seconds is None or attempt > self._max_retries:
+            metrics.api_errors.inc(method)
+            raise error
+        bucket.block(seconds)
+        logger.warning(f"FloodWait of {seconds}s on {method}, retry {attempt}/{self._max_retries}")
+
+    async def retry_after(self, method: str, error: FloodError, attempt: int) -> None:
+        """Wait out FloodWait of a call that cannot go through call(), such as a streamed download"""
+        bucket = self._buckets_for(method, None)[0]
+        self._handle_flood(method, error, attempt, bucket)
+        await self._acquire([bucket])
+
+    def wait_time(self, method: str, destination: Optional[int] = None) -> float:
+        """Get seconds until method can be called for destination"""
+        return max(bucket.delay() for bucket in self._buckets_for(method, destination))
+
+    def get_wait_times(self) -> Dict[str, float]:
+        """Get current wait time in seconds of every throttled bucket"""
+        waits = {}
+        for name, bucket in self._buckets.items():
+            delay = bucket.delay()
+            if delay > 0:
+                waits[name] = round(delay, 1)
+        return waits
@@ -0,0 +1,62 @@
+from typing import Callable, Dict, Optional
+from loguru import logger
+from periodic_flusher import PeriodicFlusher
+from rate_limiter import RateLimiter
+
+class ReadAcknowledger(PeriodicFlusher):
+    """Coalesces read acknowledgements to one request per channel"""
+
+    def __init__(
+        self,
+        rate_limiter: RateLimiter,
+        interval: float,
+        max_pending: int,
+        enabled: bool = True,
+        limiter_for: Optional[Callable[[int], RateLimiter]] = None
+    ):
+        self.rate_limiter = rate_limiter
+        # Picks the session that received the channel's posts, reads are per account
+        self._limiter_for = limiter_for
+        self._max_pending = max_pending
+        self.enabled = enabled
+        self._max_ids: Dict[int, int] = {}  # Highest forwarded id per channel
+        self._counts: Dict[int, int] = {}  # Messages forwarded since last acknowledgement
+        super().__init__(interval, self._max_ids, self._acknowledge)
+
+    def start(self) -> None:
+        """Start periodic flushing"""
+        if self.enabled:
+            super().start()
+
+    def mark(self, channel_id: int, max_id: int, count: int = 1) -> None:
+        """Remember messages of channel up to max_id as read"""
+        if not self.enabled:
+            return
+        if max_id > self._max_ids.get(channel_id, 0):
+            self._max_ids[channel_id] = max_id
+        self._counts[channel_id] = self._counts.get(channel_id, 0) + count
+        if self._counts[channel_id] >= self._max_pending:
+            self.send_early(channel_id)
+
+    async def _acknowledge(self, channel_id: int) -> None:
+        max_id = self._max_ids.pop(channel_id, None)
+        self._counts.pop(channel_id, None)
+        if max_id is None:
+            return
+        rate_limiter = self._limiter_for(channel_id) if self._limiter_for else self.rate_limiter
+        try:
+            await rate_limiter.call(
+                'send_read_acknowledge',
+                channel_id,
+                max_id=max_id,
+                destination=channel_id
+            )
+        except Exception as e:
+            logger.warning(f"Could not mark messages of channel {channel_id} as read: {str(e)}")
+
+    async def flush(self) -> int:
+        """Acknowledge all pending channels"""
+        count = await super().flush()
+        if count:
+            logger.debug("Marked {} channels as read", count)
+        return count
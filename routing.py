@@ -0,0 +1,160 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Set
+from telethon.tl.types import Message, MessageMediaWebPage
+from loguru import logger
+from storage import Storage
+
+MEDIA_TYPES = ('text', 'photo', 'video', 'gif', 'sticker', 'voice', 'audio', 'document', 'poll', 'other')
+
+def media_type(message: Message) -> str:
+    """Get media type name used by route filters"""
+    media = message.media
+    if media is None or isinstance(media, MessageMediaWebPage):
+        return 'text'
+    for name in ('photo', 'gif', 'sticker', 'video', 'voice', 'audio', 'poll', 'document'):
+        if getattr(message, name, None):
+            return name
+    return 'other'
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == '_'
+
+def _on_word_boundaries(text: str, start: int, end: int, keyword: str) -> bool:
+    """Check that match is a whole word, so 'ai' does not match 'said'"""
+    # Edges of keywords like "c++" are not word characters and need no boundary
+    if _is_word_char(keyword[0]) and start > 0 and _is_word_char(text[start - 1]):
+        return False
+    if _is_word_char(keyword[-1]) and end < len(text) and _is_word_char(text[end]):
+        return False
+    return True
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton matching many keywords in one pass over the text"""
+
+    def __init__(self, keywords: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Set[str]] = [set()]
+        for keyword in keywords:
+            self._add(keyword)
+        self._build_links()
+
+    def _add(self, keyword: str) -> None:
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(set())
+            state = next_state
+        self._output[state].add(keyword)
+
+    def _build_links(self) -> None:
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] |= self._output[self._fail[next_state]]
+
+    def search(self, text: str) -> Set[str]:
+        """Get all keywords found in text as whole words"""
+        found: Set[str] = set()
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                for keyword in output[state]:
+                    if keyword not in found and _on_word_boundaries(text, end + 1 - len(keyword), end + 1, keyword):
+                        found.add(keyword)
+        return found
+
+class Route:
+    """Compiled routing rule"""
+
+    def __init__(self, rule: Dict[str, Any]):
+        self.id: int = rule['id']
+        self.source: Optional[int] = rule.get('source')
+        self.target: int = rule['target']
+        self.include: Set[str] = {keyword.lower() for keyword in rule.get('include', [])}
+        self.exclude: Set[str] = {keyword.lower() for keyword in rule.get('exclude', [])}
+        self.regex: Optional[Pattern] = re.compile(rule['regex'], re.IGNORECASE) if rule.get('regex') else None
+        self.media: Set[str] = set(rule.get('media', []))
+
+    def matches(self, keywords: Set[str], text: str, media: Set[str]) -> bool:
+        """Check message keywords, text and media types against rule filters"""
+        if self.include and not (self.include & keywords):
+            return False
+        if self.exclude & keywords:
+            return False
+        if self.media and not (self.media & media):
+            return False
+        if self.regex and not self.regex.search(text):
+            return False
+        return True
+
+class Router:
+    """Maps messages of source channels to target channels using stored routes"""
+
+    def __init__(self, storage: Storage):
+        self.storage = storage
+        self._by_source: Dict[int, List[Route]] = {}
+        self._global: List[Route] = []
+        self._automaton: Optional[KeywordAutomaton] = None
+        self.compile()
+
+    def compile(self) -> None:
+        """Rebuild routes and keyword automaton from storage"""
+        by_source: Dict[int, List[Route]] = {}
+        global_routes: List[Route] = []
+        keywords: Set[str] = set()
+        for rule in self.storage.get_routes():
+            try:
+                route = Route(rule)
+            except re.error as e:
+                logger.error(f"Skipping route {rule.get('id')} with invalid regex: {str(e)}")
+                continue
+            keywords |= route.include | route.exclude
+            if route.source is None:
+                global_routes.append(route)
+            else:
+                by_source.setdefault(route.source, []).append(route)
+
+        self._by_source = by_source
+        self._global = global_routes
+        self._automaton = KeywordAutomaton(keywords) if keywords else None
+        logger.debug(f"Compiled {len(global_routes) + sum(map(len, by_source.values()))} routes with {len(keywords)} keywords")
+
+    def has_targets(self) -> bool:
+        """Check if messages can be routed anywhere"""
+        return bool(self._by_source or self._global or self.storage.get_target())
+
+    def route(self, channel_id: int, messages: List[Message]) -> List[int]:
+        """Get target channels for message or album of source channel"""
+        routes = self._by_source.get(channel_id, []) + self._global
+        if not self._by_source and not self._global:
+            # Without routes everything goes to the single target channel
+            target = self.storage.get_target()
+            return [target] if target else []
+        if not routes:
+            return []
+
+        text = "\n".join(message.message or '' for message in messages)
+        lowered = text.lower()
+        keywords = self._automaton.search(lowered) if self._automaton else set()
+        media = {media_type(message) for message in messages}
+
+        targets = []
+        for route in routes:
+            if route.target not in targets and route.matches(keywords, text, media):
+                targets.append(route.target)
+        return targets
@@ -0,0 +1,209 @@
+import asyncio
+import hashlib
+import time
+from bisect import bisect
+from typing import Dict, Iterable, List, Optional, Tuple
+from telethon import TelegramClient, events, utils
+from telethon.tl.functions.channels import JoinChannelRequest
+from telethon.tl.types import PeerChannel
+from loguru import logger
+from rate_limiter import RateLimiter
+from storage import Storage
+
+# FloodWaits of these calls stall forwarding, others (joins, lookups) do not move channels away
+SHARD_FLOOD_METHODS = frozenset({'forward_messages', 'send_message', 'send_file', 'get_messages'})
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+class HashRing:
+    """Consistent hash ring, adding or removing a node only moves the keys of that node"""
+
+    def __init__(self, nodes: Iterable[str], replicas: int = 100):
+        points: List[Tuple[int, str]] = sorted(
+            (_hash(f"{node}:{n}"), node) for node in nodes for n in range(replicas)
+        )
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def get(self, key: int) -> Optional[str]:
+        """Get node owning key"""
+        if not self._nodes:
+            return None
+        return self._nodes[bisect(self._hashes, _hash(str(key))) % len(self._nodes)]
+
+class Session:
+    """Telegram account of the pool with its own rate limits and monitored channels"""
+
+    def __init__(self, name: str, client: TelegramClient, rate_limiter: RateLimiter, primary: bool = False):
+        self.name = name
+        self.client = client
+        self.rate_limiter = rate_limiter
+        self.primary = primary
+        # Telethon drops updates from other chats before building the handler call
+        self.channel_filter = events.NewMessage(chats=set())
+        self.edit_filter = events.MessageEdited(chats=set())
+        self.delete_filter = events.MessageDeleted(chats=set())
+        self.blocked_until = 0.0
+
+    def is_blocked(self) -> bool:
+        return self.blocked_until > time.monotonic()
+
+    def _filters(self) -> List[events.common.EventBuilder]:
+        return [self.channel_filter, self.edit_filter, self.delete_filter]
+
+    def add_channel(self, channel_id: int) -> None:
+        # Telethon replaces the set when resolving the filter, so always look it up
+        for builder in self._filters():
+            builder.chats.add(utils.get_peer_id(PeerChannel(channel_id)))
+
+    def remove_channel(self, channel_id: int) -> None:
+        for builder in self._filters():
+            builder.chats.discard(utils.get_peer_id(PeerChannel(channel_id)))
+
+    def channel_count(self) -> int:
+        return len(self.channel_filter.chats)
+
+class SessionPool:
+    """Spreads monitored channels across accounts by consistent hashing"""
+
+    def __init__(self, storage: Storage, flood_threshold: float):
+        self.storage = storage
+        self._flood_threshold = flood_threshold
+        self._sessions: Dict[str, Session] = {}
+        self._ring = HashRing([])
+        self._primary: Optional[Session] = None
+        self._joins: Dict[Tuple[str, int], asyncio.Task] = {}
+        storage.add_listener(self._on_channel_change)
+
+    def add(self, session: Session) -> None:
+        """Add session to pool, call rebalance() afterwards to move its share of channels"""
+        self._sessions[session.name] = session
+        if session.primary:
+            self._primary = session
+        session.rate_limiter.on_flood = lambda method, seconds: self._on_flood(session, method, seconds)
+
+    def sessions(self) -> List[Session]:
+        return list(self._sessions.values())
+
+    def owner(self, channel_id: int) -> Session:
+        """Get session receiving and forwarding posts of channel"""
+        return self._sessions.get(self.storage.get_shard(channel_id)) or self._primary
+
+    def deliverers(self, channel_id: int, target_channel_id: int) -> List[RateLimiter]:
+        """Get rate limiters able to forward from channel, least throttled first and owner as last resort"""
+        owner = self.owner(channel_id)
+        if len(self._sessions) == 1 or not owner.rate_limiter.wait_time('forward_messages', target_channel_id):
+            return [owner.rate_limiter]
+        others = sorted(
+            (session for session in self._sessions.values() if session is not owner and not session.is_blocked()),
+            key=lambda session: session.rate_limiter.wait_time('forward_messages', target_channel_id)
+        )
+        return [session.rate_limiter for session in others] + [owner.rate_limiter]
+
+    def restore(self) -> None:
+        """Let primary session monitor every channel until secondary sessions are started"""
+        for channel_id in self.storage.get_channels():
+            self._primary.add_channel(channel_id)
+
+    def rebalance(self) -> int:
+        """Assign every monitored channel to its ring node among sessions not in FloodWait"""
+        available = [name for name, session in self._sessions.items() if not session.is_blocked()]
+        self._ring = HashRing(available or list(self._sessions))
+
+        moved: Dict[int, str] = {}
+        joining = 0
+        for channel_id in self.storage.get_channels():
+            session = self._sessions[self._ring.get(channel_id)]
+            if not self._is_member(session, channel_id):
+                # Channel stays with a session receiving its posts until the join is done
+                self._ensure_joined(session, channel_id)
+                joining += 1
+                session = self.owner(channel_id)
+                if not self._is_member(session, channel_id):
+                    session = self._primary
+            if self.storage.get_shard(channel_id) != session.name:
+                moved[channel_id] = session.name
+            self._assign(session, channel_id)
+        if moved:
+            self.storage.set_shards(moved)
+        if moved or joining:
+            logger.info(
+                f"Rebalanced {len(moved)} channels across {len(available)} sessions, {joining} wait for a join"
+            )
+        return len(moved)
+
+    def _assign(self, session: Session, channel_id: int) -> None:
+        """Receive posts of channel by session only"""
+        for other in self._sessions.values():
+            if other is session:
+                other.add_channel(channel_id)
+            else:
+                other.remove_channel(channel_id)
+
+    def _is_member(self, session: Session, channel_id: int) -> bool:
+        # The primary account manages the monitoring list and is already a member
+        return session.primary or channel_id in self.storage.get_shard_members(session.name)
+
+    def _on_channel_change(self, channel_id: int, added: bool) -> None:
+        """Assign channels added to monitoring list, drop removed ones from their session"""
+        if not self._sessions:
+            return
+        if added:
+            session = self._sessions[self._ring.get(channel_id) or self._primary.name]
+            if not self._is_member(session, channel_id):
+                self._ensure_joined(session, channel_id)
+                session = self._primary
+            self.storage.set_shards({channel_id: session.name})
+            self._assign(session, channel_id)
+        else:
+            for session in self._sessions.values():
+                session.remove_channel(channel_id)
+
+    def _ensure_joined(self, session: Session, channel_id: int) -> None:
+        """Join channel from a secondary session so it can receive its updates"""
+        key = (session.name, channel_id)
+        if key not in self._joins:
+            self._joins[key] = asyncio.create_task(self._join(session, channel_id))
+
+    async def _join(self, session: Session, channel_id: int) -> None:
+        try:
+            # Access hashes are per account, public channels are resolved by username
+            username = self.storage.get_channel_meta(channel_id).get('username')
+            entity = await session.rate_limiter.call('get_input_entity', username or PeerChannel(channel_id))
+            await session.rate_limiter.invoke(JoinChannelRequest(entity))
+            self.storage.add_shard_member(session.name, channel_id)
+            logger.info(f"Session {session.name} joined channel {channel_id}")
+        except Exception as e:
+            logger.warning(
+                f"Session {session.name} could not join channel {channel_id}, "
+                f"keeping it on {self.owner(channel_id).name}: {str(e)}"
+            )
+            return
+        finally:
+            self._joins.pop((session.name, channel_id), None)
+        # Posts are received by the new session only once it is a member
+        if self.storage.is_monitored(channel_id) and self._ring.get(channel_id) == session.name:
+            self.storage.set_shards({channel_id: session.name})
+            self._assign(session, channel_id)
+
+    def set_members(self, session: Session, channel_ids: Iterable[int]) -> None:
+        """Remember channels session is already a member of, as listed in its dialogs"""
+        self.storage.set_shard_members(session.name, channel_ids)
+
+    def _on_flood(self, session: Session, method: str, seconds: float) -> None:
+        """Move channels away from session stuck in a long FloodWait until it is over"""
+        if (len(self._sessions) == 1 or method not in SHARD_FLOOD_METHODS
+                or seconds < self._flood_threshold or session.is_blocked()):
+            return
+        session.blocked_until = time.monotonic() + seconds
+        logger.warning(f"Session {session.name} got FloodWait of {seconds}s on {method}, moving its channels")
+        self.rebalance()
+        asyncio.get_running_loop().call_later(seconds + 1, self.rebalance)
+
+    async def stop(self) -> None:
+        """Cancel pending joins"""
+        for task in self._joins.values():
+            task.cancel()
+        await asyncio.gather(*self._joins.values(), return_exceptions=True)
+        self._joins.clear()
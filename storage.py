@@ -1,12 +1,32 @@
 import json
-from typing import List, Optional
-from config import DB_FILE
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set
+from config import DB_FILE, LAST_IDS_SAVE_INTERVAL, DIGEST_MODE
 from loguru import logger
+from outbox import Outbox
 
 class Storage:
     def __init__(self):
-        self.channels: List[int] = []
+        # Insertion ordered dict used as an indexed set of channels with their metadata
+        self.channels: Dict[int, Dict[str, Any]] = {}
         self.target_channel: Optional[int] = None
+        self.last_ids: Dict[int, int] = {}  # Last forwarded message id per channel
+        self.routes: List[Dict[str, Any]] = []  # Routing rules, see routing.Route
+        self.digest_mode = DIGEST_MODE
+        self.dialogs_synced = 0  # Date of newest dialog seen by last /add_all_channels
+        self.priorities: Dict[int, int] = {}  # Scheduling weight of channels, default 1
+        self.shards: Dict[int, str] = {}  # Session owning each channel, see session_pool
+        self.shard_members: Dict[str, Set[int]] = {}  # Channels joined by secondary sessions
+        self.running = False  # Started with /start, kept across restarts
+        self.paused = False  # Stopped with /stop after being started
+        self._last_ids_journal: Optional[Outbox] = None  # Keeps last ids out of channels file
+        self._last_save = 0.0
+        self._batch_depth = 0
+        self._dirty = False
+        self._listeners: List[Callable[[int, bool], None]] = []
         self.load()
 
     def load(self) -> None:
@@ -14,29 +34,81 @@ def load(self) -> None:
         try:
             with open(DB_FILE, 'r') as f:
                 data = json.load(f)
-                self.channels = data.get('channels', [])
+                meta = data.get('channel_meta', {})
+                self.channels = {
+                    channel_id: meta.get(str(channel_id), {})
+                    for channel_id in data.get('channels', [])
+                }
                 self.target_channel = data.get('target_channel')
-                logger.debug(f"Loaded channels: {self.channels}, target: {self.target_channel}")
+                self.last_ids = {int(k): v for k, v in data.get('last_ids', {}).items()}
+                self.routes = data.get('routes', [])
+                self.digest_mode = data.get('digest_mode', DIGEST_MODE)
+                self.dialogs_synced = data.get('dialogs_synced', 0)
+                self.priorities = {int(k): v for k, v in data.get('priorities', {}).items()}
+                self.shards = {int(k): v for k, v in data.get('shards', {}).items()}
+                self.shard_members = {k: set(v) for k, v in data.get('shard_members', {}).items()}
+                self.running = data.get('running', False)
+                self.paused = data.get('paused', False)
+                logger.debug(f"Loaded {len(self.channels)} channels, target: {self.target_channel}")
         except FileNotFoundError:
             logger.debug("No existing channels file, creating new one")
             self.save()
 
     def save(self) -> None:
-        """Save channels data to file"""
-        with open(DB_FILE, 'w') as f:
-            data = {
-                'channels': self.channels,
-                'target_channel': self.target_channel
-            }
-            json.dump(data, f)
-            logger.debug(f"Saved channels: {self.channels}, target: {self.target_channel}")
-
-    def add_channel(self, channel_id: int) -> bool:
+        """Save channels data to file, deferred until the end of a batch"""
+        if self._batch_depth:
+            self._dirty = True
+            return
+
+        data = {
+            'channels': list(self.channels),
+            'channel_meta': {str(k): v for k, v in self.channels.items() if v},
+            'target_channel': self.target_channel,
+            'routes': self.routes,
+            'digest_mode': self.digest_mode,
+            'dialogs_synced': self.dialogs_synced,
+            'priorities': self.priorities,
+            'shards': self.shards,
+            'shard_members': {k: sorted(v) for k, v in self.shard_members.items()},
+            'running': self.running,
+            'paused': self.paused
+        }
+        if self._last_ids_journal is None:
+            data['last_ids'] = self.last_ids
+        # Write to temp file and rename so a crash never leaves a truncated file
+        directory = os.path.dirname(os.path.abspath(DB_FILE))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.channels-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, DB_FILE)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        self._dirty = False
+        self._last_save = time.monotonic()
+        logger.debug(f"Saved {len(self.channels)} channels, target: {self.target_channel}")
+
+    @contextmanager
+    def batch(self) -> Iterator['Storage']:
+        """Group several changes into a single save"""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth and self._dirty:
+                self.save()
+
+    def add_channel(self, channel_id: int, metadata: Optional[Dict[str, Any]] = None) -> bool:
         """Add channel to monitoring list"""
         if channel_id not in self.channels:
-            self.channels.append(channel_id)
-            logger.info(f"Added channel {channel_id} to monitoring list")
-            self.save()
+            # Listeners may store their own changes, saved together with the channel
+            with self.batch():
+                self.channels[channel_id] = dict(metadata or {})
+                logger.info(f"Added channel {channel_id} to monitoring list")
+                self._notify(channel_id, True)
+                self.save()
             return True
         logger.debug(f"Channel {channel_id} already in monitoring list")
         return False
@@ -44,13 +116,28 @@ def add_channel(self, channel_id: int) -> bool:
     def remove_channel(self, channel_id: int) -> bool:
         """Remove channel from monitoring list"""
         if channel_id in self.channels:
-            self.channels.remove(channel_id)
-            logger.info(f"Removed channel {channel_id} from monitoring list")
-            self.save()
+            with self.batch():
+                del self.channels[channel_id]
+                self.last_ids.pop(channel_id, None)
+                if self._last_ids_journal is not None:
+                    self._last_ids_journal.forget_last_id(channel_id)
+                self.shards.pop(channel_id, None)
+                self.priorities.pop(channel_id, None)
+                logger.info(f"Removed channel {channel_id} from monitoring list")
+                self._notify(channel_id, False)
+                self.save()
             return True
         logger.debug(f"Channel {channel_id} not in monitoring list")
         return False
 
+    def add_listener(self, callback: Callable[[int, bool], None]) -> None:
+        """Register callback called with (channel_id, added) when monitoring list changes"""
+        self._listeners.append(callback)
+
+    def _notify(self, channel_id: int, added: bool) -> None:
+        for callback in self._listeners:
+            callback(channel_id, added)
+
     def set_target(self, channel_id: int) -> None:
         """Set target channel"""
         old_target = self.target_channel
@@ -58,10 +145,150 @@ def set_target(self, channel_id: int) -> None:
         logger.info(f"Changed target channel from {old_target} to {channel_id}")
         self.save()
 
+    def add_route(self, rule: Dict[str, Any]) -> int:
+        """Add routing rule, returns its id"""
+        rule = dict(rule, id=max((route['id'] for route in self.routes), default=0) + 1)
+        self.routes.append(rule)
+        logger.info(f"Added route {rule['id']}: {rule}")
+        self.save()
+        return rule['id']
+
+    def remove_route(self, route_id: int) -> bool:
+        """Remove routing rule"""
+        for route in self.routes:
+            if route['id'] == route_id:
+                self.routes.remove(route)
+                logger.info(f"Removed route {route_id}")
+                self.save()
+                return True
+        logger.debug(f"Route {route_id} not found")
+        return False
+
+    def get_routes(self) -> List[Dict[str, Any]]:
+        """Get routing rules"""
+        return self.routes
+
+    def set_digest_mode(self, enabled: bool) -> None:
+        """Enable or disable digest mode"""
+        self.digest_mode = enabled
+        logger.info(f"Digest mode {'enabled' if enabled else 'disabled'}")
+        self.save()
+
+    def get_digest_mode(self) -> bool:
+        """Check if text posts are collected into digests"""
+        return self.digest_mode
+
+    def is_monitored(self, channel_id: int) -> bool:
+        """Check if channel is in monitoring list"""
+        return channel_id in self.channels
+
     def get_channels(self) -> List[int]:
         """Get list of monitored channels"""
-        return self.channels
+        return list(self.channels)
+
+    def get_channel_meta(self, channel_id: int) -> Dict[str, Any]:
+        """Get metadata stored for channel"""
+        return self.channels.get(channel_id, {})
+
+    def update_channel_meta(self, channel_id: int, **metadata: Any) -> None:
+        """Update metadata of monitored channel"""
+        if channel_id not in self.channels:
+            return
+        self.channels[channel_id].update(metadata)
+        self.save()
+
+    def update_last_id(self, channel_id: int, message_id: int) -> None:
+        """Remember last forwarded message id of channel"""
+        if message_id <= self.last_ids.get(channel_id, 0):
+            return
+        self.last_ids[channel_id] = message_id
+        if self._last_ids_journal is not None:
+            self._last_ids_journal.set_last_id(channel_id, message_id)
+        elif time.monotonic() - self._last_save >= LAST_IDS_SAVE_INTERVAL:
+            self.save()
+
+    def attach_last_ids(self, journal: Outbox) -> None:
+        """Keep last ids in outbox database, committed together with delivered forwards"""
+        stored = journal.last_ids()
+        # Ids saved in channels file by older versions are moved over
+        for channel_id, message_id in self.last_ids.items():
+            if message_id > stored.get(channel_id, 0):
+                stored[channel_id] = message_id
+                journal.set_last_id(channel_id, message_id)
+        self.last_ids = stored
+        self._last_ids_journal = journal
+
+    def get_last_ids(self) -> Dict[int, int]:
+        """Get last forwarded message id of every monitored channel that has one"""
+        return {
+            channel_id: self.last_ids[channel_id]
+            for channel_id in self.channels
+            if channel_id in self.last_ids
+        }
+
+    def set_dialogs_synced(self, timestamp: int) -> None:
+        """Remember date of newest dialog seen by channel sync"""
+        self.dialogs_synced = max(self.dialogs_synced, timestamp)
+        self.save()
+
+    def get_dialogs_synced(self) -> int:
+        """Get date of newest dialog seen by channel sync"""
+        return self.dialogs_synced
+
+    def set_priority(self, channel_id: int, priority: int) -> None:
+        """Set scheduling weight of channel"""
+        if priority == 1:
+            self.priorities.pop(channel_id, None)
+        else:
+            self.priorities[channel_id] = priority
+        logger.info(f"Set priority of channel {channel_id} to {priority}")
+        self.save()
+
+    def get_priority(self, channel_id: int) -> int:
+        """Get scheduling weight of channel"""
+        return self.priorities.get(channel_id, 1)
+
+    def get_priorities(self) -> Dict[int, int]:
+        """Get channels with non-default priority"""
+        return self.priorities
+
+    def get_shard(self, channel_id: int) -> Optional[str]:
+        """Get name of session assigned to channel"""
+        return self.shards.get(channel_id)
+
+    def set_shards(self, assignments: Dict[int, str]) -> None:
+        """Assign channels to sessions"""
+        self.shards.update(assignments)
+        self.save()
+
+    def get_shard_members(self, session_name: str) -> Set[int]:
+        """Get channels joined by session"""
+        return self.shard_members.get(session_name, set())
+
+    def set_shard_members(self, session_name: str, channel_ids: Iterable[int]) -> None:
+        """Replace channels joined by session"""
+        self.shard_members[session_name] = set(channel_ids)
+        self.save()
+
+    def add_shard_member(self, session_name: str, channel_id: int) -> None:
+        """Remember that session joined channel"""
+        self.shard_members.setdefault(session_name, set()).add(channel_id)
+        self.save()
+
+    def set_running(self, running: bool) -> None:
+        """Remember if bot was started with /start or stopped with /stop"""
+        self.running = running
+        self.paused = not running
+        self.save()
+
+    def get_running(self) -> bool:
+        """Check if bot was left running"""
+        return self.running
+
+    def get_paused(self) -> bool:
+        """Check if bot was stopped with /stop"""
+        return self.paused
 
     def get_target(self) -> Optional[int]:
         """Get target channel"""
-        return self.target_channel 
\ No newline at end of file
+        return self.target_channel